@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+import time
+import httpx
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.config import settings
+from src.helpers.github_api import GitHubAPI, open_github_client, close_github_client
+
+# Benchmark Configuration
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8765
+TOTAL_REQUESTS = 500
+CONCURRENCY = 20
+PAGE_SIZE = 30
+
+def build_commit_page(page: int) -> list:
+
+    return [
+        {
+            "sha": f"{page:08x}{i:032x}",
+            "commit": {"message": f"Commit {i} on page {page}", "author": {"name": "bench", "date": "2024-01-01T00:00:00Z"}},
+            "html_url": f"https://github.com/bench/repo/commit/{page}{i}"
+        }
+        for i in range(PAGE_SIZE)
+    ]
+
+async def commits_handler(request: web.Request) -> web.Response:
+
+    page = int(request.query.get("page", 1))
+    return web.json_response(build_commit_page(page))
+
+async def start_stub_github() -> web.AppRunner:
+
+    app = web.Application()
+    app.router.add_get("/repos/{owner}/{repo}/commits", commits_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, STUB_HOST, STUB_PORT).start()
+    return runner
+
+async def legacy_request(base_url: str, endpoint: str, params: dict) -> list:
+
+    # Mirrors the previous make_request: a fresh client (and connection) per call
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{base_url}{endpoint}", params=params)
+        response.raise_for_status()
+        return response.json()
+
+async def run_benchmark(name: str, fetch_page) -> float:
+
+    queue = asyncio.Queue()
+    for page in range(1, TOTAL_REQUESTS + 1):
+        queue.put_nowait(page)
+
+    async def worker():
+        while not queue.empty():
+            page = queue.get_nowait()
+            result = await fetch_page(page)
+            assert result and len(result) == PAGE_SIZE
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+
+    rate = TOTAL_REQUESTS / elapsed
+    print(f" {name:<28} {TOTAL_REQUESTS} requests in {elapsed:6.2f}s  ->  {rate:8.1f} req/s")
+    return rate
+
+async def main():
+
+    print("GitHub API Client Benchmark (local stand-in server)")
+    print("=" * 60)
+
+    base_url = f"http://{STUB_HOST}:{STUB_PORT}"
+    settings.github_api_url = base_url
+    runner = await start_stub_github()
+
+    try:
+        before = await run_benchmark(
+            "client per request (before)",
+            lambda page: legacy_request(base_url, "/repos/bench/repo/commits", {"page": page, "per_page": PAGE_SIZE})
+        )
+
+        await open_github_client()
+        github_api = GitHubAPI("benchmark-token")
+        after = await run_benchmark(
+            "shared pooled client (after)",
+            lambda page: github_api.get_repository_commits("bench", "repo", page=page, per_page=PAGE_SIZE)
+        )
+        await close_github_client()
+
+        print("=" * 60)
+        print(f" Speedup: {after / before:.1f}x")
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(main())
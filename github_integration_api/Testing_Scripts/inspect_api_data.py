@@ -150,35 +150,35 @@ async def main():
             "description": "Integration Status & User Info"
         },
         {
-            "endpoint": "/data/github_organizations",
+            "endpoint": f"/data/github_organizations?user_id={TEST_USER_ID}",
             "description": "GitHub Organizations"
         },
         {
-            "endpoint": "/data/github_repos?limit=5",
+            "endpoint": f"/data/github_repos?user_id={TEST_USER_ID}&limit=5",
             "description": "GitHub Repositories"
         },
         {
-            "endpoint": "/data/github_commits?limit=3",
+            "endpoint": f"/data/github_commits?user_id={TEST_USER_ID}&limit=3",
             "description": "GitHub Commits"
         },
         {
-            "endpoint": "/data/github_pulls?limit=3",
+            "endpoint": f"/data/github_pulls?user_id={TEST_USER_ID}&limit=3",
             "description": "GitHub Pull Requests"
         },
         {
-            "endpoint": "/data/github_issues?limit=3",
+            "endpoint": f"/data/github_issues?user_id={TEST_USER_ID}&limit=3",
             "description": "GitHub Issues"
         },
         {
-            "endpoint": "/data/github_users?limit=5",
+            "endpoint": f"/data/github_users?user_id={TEST_USER_ID}&limit=5",
             "description": "GitHub Users/Members"
         },
         {
-            "endpoint": "/data/github_changelogs?limit=3",
+            "endpoint": f"/data/github_changelogs?user_id={TEST_USER_ID}&limit=3",
             "description": "GitHub Issue Events/Changelogs"
         },
         {
-            "endpoint": "/search?q=python",
+            "endpoint": f"/search?q=python&user_id={TEST_USER_ID}",
             "description": "Global Search Results"
         }
     ]
@@ -54,35 +54,35 @@ async def main():
             "description": "Integration Status"
         },
         {
-            "endpoint": "/data/github_repos?limit=10",
+            "endpoint": f"/data/github_repos?user_id={TEST_USER_ID}&limit=10",
             "description": "Repositories (limited to 10)"
         },
         {
-            "endpoint": "/data/github_commits?limit=5",
+            "endpoint": f"/data/github_commits?user_id={TEST_USER_ID}&limit=5",
             "description": "Commits (limited to 5)"
         },
         {
-            "endpoint": "/data/github_pulls?limit=5",
+            "endpoint": f"/data/github_pulls?user_id={TEST_USER_ID}&limit=5",
             "description": "Pull Requests (limited to 5)"
         },
         {
-            "endpoint": "/data/github_issues?limit=5",
+            "endpoint": f"/data/github_issues?user_id={TEST_USER_ID}&limit=5",
             "description": "Issues (limited to 5)"
         },
         {
-            "endpoint": "/data/github_organizations",
+            "endpoint": f"/data/github_organizations?user_id={TEST_USER_ID}",
             "description": "Organizations"
         },
         {
-            "endpoint": "/data/github_users?limit=5",
+            "endpoint": f"/data/github_users?user_id={TEST_USER_ID}&limit=5",
             "description": "Users (limited to 5)"
         },
         {
-            "endpoint": "/data/github_changelogs?limit=5",
+            "endpoint": f"/data/github_changelogs?user_id={TEST_USER_ID}&limit=5",
             "description": "Changelogs (limited to 5)"
         },
         {
-            "endpoint": "/search?q=python",
+            "endpoint": f"/search?q=python&user_id={TEST_USER_ID}",
             "description": "Global Search for 'python'"
         }
     ]
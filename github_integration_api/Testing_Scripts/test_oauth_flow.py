@@ -85,6 +85,17 @@ async def test_integration_status_after_oauth(user_id: str):
             print(f"Error checking status: {e}")
             return False
 
+async def wait_for_job(session: aiohttp.ClientSession, job_id: str):
+    # Resync only queues the job; poll it until a worker has finished it
+    while True:
+        async with session.get(f"{BASE_URL}/integration/jobs/{job_id}") as response:
+            job = await response.json()
+        if job.get("status") not in ("queued", "running"):
+            return job
+        progress = job.get("progress") or {}
+        print(f"  {job.get('status')}: {progress.get('phase', '')} {progress.get('counters', '')}")
+        await asyncio.sleep(2)
+
 async def main():
  
     print("Testing GitHub OAuth Integration")
@@ -116,8 +127,12 @@ async def main():
                         async with session.post(f"{BASE_URL}/integration/resync?user_id={user_id}") as response:
                             if response.status == 200:
                                 data = await response.json()
-                                print(f"Resync completed!")
-                                print(f"Stats: {data.get('stats', {})}")
+                                print(f"Resync job queued: {data.get('job_id')}")
+                                job = await wait_for_job(session, data["job_id"])
+                                print(f"Resync {job.get('status')}!")
+                                print(f"Stats: {job.get('sync_stats', {})}")
+                                if job.get("error"):
+                                    print(f"Error: {job['error']}")
                             else:
                                 text = await response.text()
                                 print(f"Resync failed: {response.status}")
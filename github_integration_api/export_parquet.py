@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from src.helpers.database import connect_to_mongo, close_mongo_connection
+from src.helpers.export import export_columnar, load_pyarrow, COLUMNAR_EXPORTS
+
+# Writes a collection's flattened columns to a Parquet file (or an Arrow IPC
+# stream) through the same streaming path as GET /export/{collection}, so memory
+# stays bounded by EXPORT_ROW_GROUP_SIZE however many rows are exported.
+async def main(args):
+
+    filter_dict = {"integration_user_id": args.user_id}
+    if args.filter:
+        filter_dict["$and"] = [json.loads(args.filter)]
+
+    await connect_to_mongo()
+    print(" Connected to MongoDB")
+
+    started = time.perf_counter()
+    written = 0
+    try:
+        with open(args.output, "wb") as output:
+            async for chunk in export_columnar(args.collection, filter_dict, args.format, args.limit):
+                output.write(chunk)
+                written += len(chunk)
+    finally:
+        await close_mongo_connection()
+
+    print(f" Wrote {written / 1024 / 1024:.1f} MB to {args.output} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export synced GitHub data as Parquet or Arrow")
+    parser.add_argument("collection", choices=list(COLUMNAR_EXPORTS))
+    parser.add_argument("user_id", type=int, help="Integration whose data is exported")
+    parser.add_argument("output", help="Output file, e.g. commits.parquet")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--filter", help="JSON object of MongoDB filter criteria")
+    parser.add_argument("--limit", type=int, default=0, help="Maximum rows, 0 for all")
+
+    args = parser.parse_args()
+    if load_pyarrow() is None:
+        sys.exit(" pyarrow is not installed: pip install pyarrow")
+    asyncio.run(main(args))
@@ -0,0 +1,24 @@
+import asyncio
+import sys
+from src.helpers.database import connect_to_mongo, close_mongo_connection, ensure_indexes
+from src.helpers.rollups import rebuild_rollups
+
+# Recomputes the analytics rollups from the synced data, e.g. to backfill them
+# after upgrading. Pass a user id to limit the rebuild to one integration.
+async def main(user_id):
+
+    await connect_to_mongo()
+    print(" Connected to MongoDB")
+
+    try:
+        # $merge needs the rollups' unique indexes
+        await ensure_indexes()
+        results = await rebuild_rollups(user_id)
+        print(f" Rebuilt rollups of {results['refreshed']} repositories for {results['users']} user(s)")
+        for repository, error in results["errors"].items():
+            print(f" {repository}: {error}")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else None))
@@ -5,6 +5,19 @@ class Settings(BaseSettings):
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "github_integration"
     
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 0
+    mongodb_max_idle_time_ms: int = 0
+    mongodb_wait_queue_timeout_ms: int = 0
+    mongodb_compressors: str = ""
+    mongodb_read_preference: str = "primary"
+    mongodb_max_staleness_seconds: int = -1
+    mongodb_write_concern: str = ""
+    mongodb_sync_write_concern: str = "1"
+    mongodb_bulk_max_documents: int = 1000
+    mongodb_bulk_max_bytes: int = 8 * 1024 * 1024
+    mongodb_bulk_concurrency: int = 4
+    
     github_client_id: str = ""
     github_client_secret: str = ""
     github_redirect_uri: str = "http://localhost:8000/auth/github/callback"
@@ -13,6 +26,59 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    github_api_url: str = "https://api.github.com"
+    github_http2: bool = True
+    github_max_connections: int = 100
+    github_max_keepalive_connections: int = 20
+    github_keepalive_expiry: float = 30.0
+    github_connect_timeout: float = 10.0
+    github_read_timeout: float = 30.0
+    github_pool_timeout: float = 30.0
+    
+    github_max_retries: int = 5
+    github_retry_backoff_base: float = 1.0
+    github_retry_backoff_max: float = 60.0
+    github_secondary_limit_wait: float = 60.0
+    github_rate_limit_reserve: int = 50
+    github_rate_limit_pace_below: int = 1000
+    github_max_rate_limit_wait: float = 3900.0
+    
+    github_page_concurrency: int = 8
+    github_max_concurrency_per_token: int = 10
+    
+    sync_max_concurrency: int = 16
+    sync_workers: int = 2
+    sync_job_poll_interval: float = 2.0
+    sync_job_progress_interval: float = 2.0
+    sync_job_stale_seconds: int = 300
+    
+    github_cache_enabled: bool = True
+    github_cache_max_body_bytes: int = 8 * 1024 * 1024
+    github_cache_ttl: int = 7 * 24 * 3600
+    
+    count_cache_ttl: float = 300.0
+    count_cache_max_entries: int = 1024
+    
+    query_cache_enabled: bool = True
+    query_cache_backend: str = "memory"
+    query_cache_ttl: float = 300.0
+    query_cache_max_entries: int = 1000
+    query_cache_max_bytes: int = 64 * 1024 * 1024
+    query_cache_max_entry_bytes: int = 4 * 1024 * 1024
+    
+    search_deadline_seconds: float = 5.0
+    search_max_time_ms: int = 3000
+    
+    search_index_max_text_length: int = 512
+    search_index_fuzzy_threshold: float = 0.6
+    search_index_refresh_interval: float = 2.0
+    search_index_refresh_overlap: float = 10.0
+    search_index_max_candidates: int = 10000
+    
+    export_batch_size: int = 2000
+    export_row_group_size: int = 100000
+    export_parquet_compression: str = "zstd"
+    
     class Config:
         env_file = ".env"
         
@@ -27,6 +93,21 @@ class Settings(BaseSettings):
         if not self.secret_key:
             missing.append("SECRET_KEY")
             
+        if self.query_cache_backend not in ("memory", "mongo"):
+            raise ValueError("QUERY_CACHE_BACKEND must be 'memory' or 'mongo'")
+        
+        read_preferences = ("primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest")
+        if self.mongodb_read_preference not in read_preferences:
+            raise ValueError(f"MONGODB_READ_PREFERENCE must be one of: {', '.join(read_preferences)}")
+        if self.mongodb_read_preference == "primary" and self.mongodb_max_staleness_seconds != -1:
+            raise ValueError("MONGODB_MAX_STALENESS_SECONDS requires a MONGODB_READ_PREFERENCE other than 'primary'")
+        if self.mongodb_max_staleness_seconds != -1 and self.mongodb_max_staleness_seconds < 90:
+            raise ValueError("MONGODB_MAX_STALENESS_SECONDS must be -1 (no limit) or at least 90")
+        
+        unknown_compressors = set(filter(None, self.mongodb_compressors.split(","))) - {"zstd", "snappy", "zlib"}
+        if unknown_compressors:
+            raise ValueError(f"Unknown MONGODB_COMPRESSORS: {', '.join(sorted(unknown_compressors))}")
+            
         if missing:
             raise ValueError(
                 f"Missing required environment variables: {', '.join(missing)}. "
@@ -0,0 +1,90 @@
+from ..helpers.database import get_index_report, ensure_indexes, index_state
+from ..helpers.search_index import search_index, rebuild_search_index
+from ..helpers.query_cache import get_query_cache_stats, clear_query_cache
+from ..helpers.count_cache import count_cache
+from ..helpers.rollups import rebuild_rollups
+from ..helpers.pool_metrics import pool_metrics
+from ..config import settings
+from typing import Optional
+
+class AdminController:
+
+    @staticmethod
+    async def get_indexes():
+        report = await get_index_report()
+        
+        return {
+            "in_sync": all(
+                not entry["missing"] and not entry["conflicts"]
+                for entry in report.values()
+            ),
+            "collections": report,
+            "last_startup_run": index_state.last_report
+        }
+
+    @staticmethod
+    async def sync_indexes(drop_conflicting: bool = False):
+        report = await ensure_indexes(drop_conflicting=drop_conflicting)
+        
+        return {
+            "message": "Index sync completed",
+            "drop_conflicting": drop_conflicting,
+            "collections": report
+        }
+
+    @staticmethod
+    async def get_search_index():
+        
+        return search_index.get_state()
+
+    @staticmethod
+    async def rebuild_search_index():
+        counts = await rebuild_search_index()
+        
+        return {
+            "message": "Search index rebuilt",
+            "indexed": counts,
+            "state": search_index.get_state()
+        }
+
+    @staticmethod
+    async def get_cache_stats():
+        
+        return {
+            "query_cache": get_query_cache_stats(),
+            "count_cache": count_cache.get_stats()
+        }
+
+    @staticmethod
+    async def clear_cache():
+        cleared = await clear_query_cache()
+        count_cache.clear()
+        
+        return {"message": "Caches cleared", "query_cache_entries": cleared}
+
+    @staticmethod
+    async def rebuild_rollups(user_id: Optional[int] = None):
+        results = await rebuild_rollups(user_id)
+        
+        return {
+            "message": "Analytics rollups rebuilt",
+            "user_id": user_id,
+            **results
+        }
+
+    @staticmethod
+    async def get_database_stats():
+        
+        return {
+            "pool": {
+                "max_pool_size": settings.mongodb_max_pool_size,
+                "min_pool_size": settings.mongodb_min_pool_size,
+                "max_idle_time_ms": settings.mongodb_max_idle_time_ms or None,
+                "wait_queue_timeout_ms": settings.mongodb_wait_queue_timeout_ms or None
+            },
+            "compressors": settings.mongodb_compressors.split(",") if settings.mongodb_compressors else [],
+            "read_preference": settings.mongodb_read_preference,
+            "write_concern": settings.mongodb_write_concern or None,
+            "sync_write_concern": settings.mongodb_sync_write_concern,
+            "servers": pool_metrics.get_stats()
+        }
@@ -0,0 +1,91 @@
+from fastapi import HTTPException
+from ..helpers.database import find_one, find_many, aggregate
+from ..helpers.rollups import AUTHOR_WEEKS_COLLECTION, REPOSITORY_ROLLUP_COLLECTION
+from datetime import date, datetime, time
+from typing import Dict, Any, Optional
+
+class AnalyticsController:
+
+    @staticmethod
+    def week_filter(since: Optional[date], until: Optional[date]) -> Dict[str, Any]:
+        # Weeks are stored as datetimes at midnight UTC
+        week = {}
+        if since:
+            week["$gte"] = datetime.combine(since, time.min)
+        if until:
+            week["$lte"] = datetime.combine(until, time.min)
+        return {"week": week} if week else {}
+
+    @staticmethod
+    async def get_repositories(user_id: int):
+        repositories = await find_many(
+            REPOSITORY_ROLLUP_COLLECTION,
+            {"integration_user_id": user_id},
+            limit=0,
+            sort=[("repository", 1)],
+            projection={"_id": 0}
+        )
+        
+        return {
+            "user_id": user_id,
+            "total_repositories": len(repositories),
+            "repositories": repositories
+        }
+
+    @staticmethod
+    async def get_repository(
+        user_id: int,
+        repository: str,
+        since: Optional[date] = None,
+        until: Optional[date] = None
+    ):
+        summary = await find_one(REPOSITORY_ROLLUP_COLLECTION, {"integration_user_id": user_id, "repository": repository})
+        if not summary:
+            raise HTTPException(status_code=404, detail=f"No analytics for repository '{repository}'")
+        summary.pop("_id", None)
+        
+        weekly_commits = await aggregate(AUTHOR_WEEKS_COLLECTION, [
+            {"$match": {
+                "integration_user_id": user_id,
+                "repository": repository,
+                **AnalyticsController.week_filter(since, until)
+            }},
+            {"$group": {"_id": "$week", "commits": {"$sum": "$commits"}, "authors": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+            {"$project": {"_id": 0, "week": "$_id", "commits": 1, "authors": 1}}
+        ])
+        
+        return {
+            "summary": summary,
+            "weekly_commits": weekly_commits
+        }
+
+    @staticmethod
+    async def get_author_weeks(
+        user_id: int,
+        repository: Optional[str] = None,
+        author: Optional[str] = None,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        limit: int = 1000
+    ):
+        filter_dict = {"integration_user_id": user_id}
+        if repository:
+            filter_dict["repository"] = repository
+        if author:
+            filter_dict["author"] = author
+        filter_dict.update(AnalyticsController.week_filter(since, until))
+        
+        rows = await find_many(
+            AUTHOR_WEEKS_COLLECTION,
+            filter_dict,
+            limit=limit,
+            sort=[("week", 1), ("repository", 1), ("author", 1)],
+            projection={"_id": 0, "run_id": 0, "integration_user_id": 0}
+        )
+        
+        return {
+            "user_id": user_id,
+            "total_rows": len(rows),
+            "rows": rows
+        }
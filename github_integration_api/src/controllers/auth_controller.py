@@ -1,7 +1,7 @@
 from fastapi import HTTPException
 from fastapi.responses import RedirectResponse
 from ..config import settings
-from ..helpers.github_api import GitHubAPI, exchange_code_for_token
+from ..helpers.github_api import GitHubAPI, GitHubAPIError, exchange_code_for_token
 from ..helpers.database import insert_one, find_one, update_one
 from ..models.github_models import GitHubIntegration, GitHubUser
 from datetime import datetime
@@ -30,7 +30,10 @@ class AuthController:
             raise HTTPException(status_code=400, detail="Failed to get access token")
         
         github_api = GitHubAPI(access_token)
-        user_info = await github_api.get_user_info()
+        try:
+            user_info = await github_api.get_user_info()
+        except GitHubAPIError as e:
+            raise HTTPException(status_code=e.status_code or 502, detail=str(e))
         if not user_info:
             raise HTTPException(status_code=400, detail="Failed to get user info from GitHub")
         
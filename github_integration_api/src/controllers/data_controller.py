@@ -1,6 +1,10 @@
 from fastapi import HTTPException, Query
-from ..helpers.database import find_many, count_documents, search_across_collections
-from typing import Dict, Any, Optional
+from ..helpers.database import find_many, search_across_collections
+from ..helpers.search_index import search_index, match_document_ids, search_documents, substring_filter
+from ..helpers.count_cache import cached_count
+from ..helpers.query_cache import cached_query
+from ..helpers.pagination import decode_cursor, encode_cursor, keyset_filter, sort_field, sort_spec
+from typing import Dict, List, Any, Optional
 import json
 
 class DataController:
@@ -14,16 +18,89 @@ class DataController:
         "github_changelogs",
         "github_users"
     ]
+
+    # Named response shapes for /data; "full" returns the stored GitHub payload as is.
+    # Search hits always use the summary view.
+    VIEWS = ["summary", "full"]
+    
+    SUMMARY_PROJECTIONS = {
+        "github_organizations": {"id": 1, "login": 1, "description": 1, "avatar_url": 1},
+        "github_repos": {
+            "id": 1, "name": 1, "full_name": 1, "description": 1, "html_url": 1,
+            "primary_language": 1, "stargazers_count": 1, "updated_at": 1
+        },
+        "github_commits": {
+            "sha": 1, "repository": 1, "commit.message": 1, "commit.author.name": 1,
+            "commit.author.date": 1, "author.login": 1, "html_url": 1
+        },
+        "github_pulls": {
+            "id": 1, "number": 1, "repository": 1, "title": 1, "state": 1,
+            "user.login": 1, "updated_at": 1, "html_url": 1
+        },
+        "github_issues": {
+            "id": 1, "number": 1, "repository": 1, "title": 1, "state": 1,
+            "user.login": 1, "updated_at": 1, "html_url": 1
+        },
+        "github_changelogs": {"id": 1, "repository": 1, "event": 1, "actor.login": 1, "created_at": 1},
+        "github_users": {"id": 1, "login": 1, "organization": 1, "avatar_url": 1, "html_url": 1}
+    }
     
     @staticmethod
     async def get_collection_data(
         collection: str,
+        user_id: int,
+        page: int = 1,
+        limit: int = 20,
+        sort_by: Optional[str] = None,
+        sort_order: str = "asc",
+        filter_json: Optional[str] = None,
+        search: Optional[str] = None,
+        search_mode: str = "substring",
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        view: str = "full",
+        fields: Optional[str] = None
+    ):
+        params = {
+            "collection": collection,
+            "user_id": user_id,
+            "page": page,
+            "limit": limit,
+            "sort_by": sort_by,
+            "sort_order": sort_order,
+            "filter_json": filter_json,
+            "search": search,
+            "search_mode": search_mode,
+            "cursor": cursor,
+            "include_total": include_total,
+            "view": view,
+            "fields": fields
+        }
+        
+        return await cached_query(
+            "data",
+            user_id,
+            params,
+            lambda: DataController.query_collection_data(**params),
+            # Regex fallbacks while the search index loads are not worth keeping
+            should_cache=lambda result: not search or result["meta"]["search_index_used"]
+        )
+    
+    @staticmethod
+    async def query_collection_data(
+        collection: str,
+        user_id: int,
         page: int = 1,
         limit: int = 20,
         sort_by: Optional[str] = None,
         sort_order: str = "asc",
         filter_json: Optional[str] = None,
-        search: Optional[str] = None
+        search: Optional[str] = None,
+        search_mode: str = "substring",
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        view: str = "full",
+        fields: Optional[str] = None
     ):
         if collection not in DataController.ALLOWED_COLLECTIONS:
             raise HTTPException(
@@ -40,81 +117,238 @@ class DataController:
         # Calculate skip
         skip = (page - 1) * limit
         
+        projection = DataController.build_projection(collection, view, fields, sort_by)
+        selected_fields = sorted(projection) if fields else None
+        
         # Parse filter
-        filter_dict = {}
-        if filter_json:
-            try:
-                filter_dict = json.loads(filter_json)
-            except json.JSONDecodeError:
-                raise HTTPException(status_code=400, detail="Invalid filter JSON format")
-        
-        # search functionality
+        conditions = DataController.parse_filter(filter_json)
+        
+        # search functionality: the trigram index narrows the query to matching _ids;
+        # a regex scan over the same fields is only used while the index is loading
+        # or for 1-2 character keywords
+        search_index_used = False
+        search_truncated = False
         if search:
-            search_conditions = {
-                "$or": [
-                    {"name": {"$regex": search, "$options": "i"}},
-                    {"title": {"$regex": search, "$options": "i"}},
-                    {"description": {"$regex": search, "$options": "i"}},
-                    {"login": {"$regex": search, "$options": "i"}},
-                    {"full_name": {"$regex": search, "$options": "i"}},
-                    {"body": {"$regex": search, "$options": "i"}}
-                ]
-            }
-            
-            if filter_dict:
-                filter_dict = {"$and": [filter_dict, search_conditions]}
+            candidates = await match_document_ids(search, collection, user_id, fuzzy=search_mode == "fuzzy")
+            if candidates is not None:
+                document_ids, search_truncated = candidates
+                search_index_used = True
+                conditions.append({"_id": {"$in": document_ids}})
+                if search_mode != "fuzzy":
+                    # Re-checks the candidates against the stored fields, which the index may be behind
+                    conditions.append(substring_filter(collection, search))
             else:
-                filter_dict = search_conditions
+                conditions.append(substring_filter(collection, search))
+        
+        filter_dict = DataController.scoped_filter(user_id, conditions)
         
         sort_order_int = 1 if sort_order.lower() == "asc" else -1
         
-        documents = await find_many(
-            collection_name=collection,
-            filter_dict=filter_dict,
-            skip=skip,
-            limit=limit,
-            sort_by=sort_by,
-            sort_order=sort_order_int
-        )
+        # Counting is a second pass over every match, so it can be skipped; totals are
+        # counted on the user's index range and cached until the user's next sync
+        total_count = None
+        total_pages = None
+        total_is_exact = None
+        if include_total:
+            total_count = await cached_count(collection, user_id, filter_dict)
+            # Only the best SEARCH_INDEX_MAX_CANDIDATES matches are paged through
+            total_is_exact = not search_truncated
+            total_pages = (total_count + limit - 1) // limit
         
-        total_count = await count_documents(collection, filter_dict)
+        if cursor:
+            position = decode_cursor(cursor)
+            if not position:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            if (position["c"], position["s"], position["o"]) != (collection, sort_field(sort_by), sort_order_int):
+                raise HTTPException(status_code=400, detail="Cursor does not match the requested collection or sort")
+            
+            # A previous page is read backwards from the first row of the current one
+            backwards = position["d"] == "prev"
+            ascending = (sort_order_int == 1) != backwards
+            page_filter = keyset_filter(sort_by, ascending, position["k"], position["i"])
+            
+            documents = await find_many(
+                collection_name=collection,
+                filter_dict=DataController.scoped_filter(user_id, conditions + [page_filter]),
+                limit=limit + 1,
+                sort=sort_spec(sort_by, 1 if ascending else -1),
+                projection=projection
+            )
+            has_more = len(documents) > limit
+            documents = documents[:limit]
+            if backwards:
+                documents.reverse()
+            
+            current_page = None
+            has_next = has_more or backwards
+            has_prev = has_more or not backwards
+        else:
+            documents = await find_many(
+                collection_name=collection,
+                filter_dict=filter_dict,
+                skip=skip,
+                limit=limit + 1,
+                sort=sort_spec(sort_by, sort_order_int),
+                projection=projection
+            )
+            has_next = len(documents) > limit
+            documents = documents[:limit]
+            
+            current_page = page
+            has_prev = page > 1
         
-        # Calculate pagination info
-        total_pages = (total_count + limit - 1) // limit
-        has_next = page < total_pages
-        has_prev = page > 1
+        next_cursor = None
+        prev_cursor = None
+        if documents and has_next:
+            next_cursor = encode_cursor(collection, sort_by, sort_order_int, documents[-1], "next")
+        if documents and has_prev:
+            prev_cursor = encode_cursor(collection, sort_by, sort_order_int, documents[0], "prev")
         
         return {
             "data": documents,
             "pagination": {
-                "current_page": page,
+                "current_page": current_page,
                 "total_pages": total_pages,
                 "total_items": total_count,
+                "total_is_exact": total_is_exact,
                 "items_per_page": limit,
                 "has_next": has_next,
-                "has_previous": has_prev
+                "has_previous": has_prev,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
             },
             "meta": {
                 "collection": collection,
-                "filters_applied": bool(filter_dict),
+                "user_id": user_id,
+                "filters_applied": bool(conditions),
                 "search_applied": bool(search),
+                "search_index_used": search_index_used,
+                "search_truncated": search_truncated,
                 "sort_by": sort_by,
-                "sort_order": sort_order
+                "sort_order": sort_order,
+                "view": view,
+                "fields": selected_fields
             }
         }
     
     @staticmethod
-    async def global_search(keyword: str):
+    def parse_filter(filter_json: Optional[str]) -> List[Dict[str, Any]]:
+        if not filter_json:
+            return []
+        try:
+            return [json.loads(filter_json)]
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid filter JSON format")
+    
+    @staticmethod
+    def scoped_filter(user_id: int, conditions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Restricts conditions to one user's documents.
+
+        The user is a top-level equality so the planner can use the integration_user_id
+        index prefix; caller filters are nested under $and, so one that names another
+        integration_user_id matches nothing instead of widening the scope.
+        """
+        scope = {"integration_user_id": user_id}
+        if conditions:
+            scope["$and"] = conditions
+        return scope
+    
+    @staticmethod
+    def requested_fields(collection: str, view: str = "full", fields: Optional[str] = None) -> Optional[List[str]]:
+        """The fields selected by fields or the view, in request order; None for the full document."""
+        if view not in DataController.VIEWS:
+            raise HTTPException(status_code=400, detail=f"Invalid view '{view}'. Allowed views: {DataController.VIEWS}")
+        
+        if fields:
+            requested = [field.strip() for field in fields.split(",") if field.strip()]
+            invalid = [field for field in requested if field.startswith("$") or ".." in field or field.endswith(".")]
+            if not requested or invalid:
+                raise HTTPException(status_code=400, detail=f"Invalid fields: {invalid or fields}")
+            return list(dict.fromkeys(requested))
+        if view == "summary":
+            return list(DataController.SUMMARY_PROJECTIONS[collection])
+        return None
+    
+    @staticmethod
+    def build_projection(
+        collection: str,
+        view: str = "full",
+        fields: Optional[str] = None,
+        sort_by: Optional[str] = None
+    ) -> Optional[Dict[str, int]]:
+        """Turns view/fields into a MongoDB projection; explicit fields win over the view."""
+        requested = DataController.requested_fields(collection, view, fields)
+        if requested is None:
+            return None
+        
+        # Cursors are built from the sort value, so it is always returned
+        if sort_by:
+            requested.append(sort_by)
+        
+        # MongoDB rejects a projection that names both a field and one of its sub-fields
+        selected = set(requested)
+        return {
+            field: 1 for field in sorted(selected)
+            if not any(field.startswith(f"{parent}.") for parent in selected)
+        }
+    
+    @staticmethod
+    async def global_search(keyword: str, user_id: int, mode: str = "text"):
         if not keyword or len(keyword.strip()) < 2:
             raise HTTPException(status_code=400, detail="Search keyword must be at least 2 characters long")
         
-        results = await search_across_collections(keyword, DataController.ALLOWED_COLLECTIONS)
+        return await cached_query(
+            "search",
+            user_id,
+            {"keyword": keyword, "user_id": user_id, "mode": mode},
+            lambda: DataController.search(keyword, user_id, mode),
+            # Partial results are served but not cached
+            should_cache=lambda result: not result["timed_out"] and not result["errors"]
+        )
+    
+    @staticmethod
+    async def search(keyword: str, user_id: int, mode: str = "text"):
+        search = None
+        if mode in ("substring", "fuzzy"):
+            search = await search_documents(
+                keyword,
+                DataController.ALLOWED_COLLECTIONS,
+                user_id,
+                fuzzy=mode == "fuzzy",
+                projections=DataController.SUMMARY_PROJECTIONS
+            )
+            # Unindexed regex scans only run when the caller asks for mode=regex
+            if search is None and not search_index.ready:
+                raise HTTPException(
+                    status_code=503,
+                    detail="The search index is still loading; retry shortly, or use mode=text or mode=regex",
+                    headers={"Retry-After": "5"}
+                )
+            if search is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Keyword too short for {mode} search; use at least 3 characters or mode=text"
+                )
+        
+        if search is None:
+            search = await search_across_collections(
+                keyword,
+                DataController.ALLOWED_COLLECTIONS,
+                user_id,
+                mode=mode,
+                projections=DataController.SUMMARY_PROJECTIONS
+            )
+        results = search["results"]
         
         total_results = sum(len(items) for items in results.values())
         
         return {
             "keyword": keyword,
+            "user_id": user_id,
+            "mode": mode,
             "total_results": total_results,
             "results": results,
+            "errors": search["errors"],
+            "timed_out": search["timed_out"],
             "collections_searched": DataController.ALLOWED_COLLECTIONS
         }
@@ -0,0 +1,62 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from .data_controller import DataController
+from ..helpers.export import export_ndjson, export_csv, export_columnar, load_pyarrow, COLUMNAR_EXPORTS
+from typing import Optional
+
+class ExportController:
+
+    FORMATS = {
+        "ndjson": ("application/x-ndjson", "ndjson"),
+        "csv": ("text/csv; charset=utf-8", "csv"),
+        "parquet": ("application/vnd.apache.parquet", "parquet"),
+        "arrow": ("application/vnd.apache.arrow.stream", "arrows")
+    }
+
+    @staticmethod
+    async def export_collection(
+        collection: str,
+        user_id: int,
+        format: str = "ndjson",
+        filter_json: Optional[str] = None,
+        view: str = "full",
+        fields: Optional[str] = None,
+        limit: int = 0
+    ):
+        if collection not in DataController.ALLOWED_COLLECTIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Collection '{collection}' not allowed. Allowed collections: {DataController.ALLOWED_COLLECTIONS}"
+            )
+        if format not in ExportController.FORMATS:
+            raise HTTPException(status_code=400, detail=f"Invalid format '{format}'. Allowed formats: {list(ExportController.FORMATS)}")
+        
+        # Everything that can fail is checked here, before the 200 status is sent
+        filter_dict = DataController.scoped_filter(user_id, DataController.parse_filter(filter_json))
+        
+        if format in ("parquet", "arrow"):
+            # Columnar formats have a fixed flattened schema per collection, so view/fields don't apply
+            if collection not in COLUMNAR_EXPORTS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Format '{format}' is available for: {list(COLUMNAR_EXPORTS)}"
+                )
+            if load_pyarrow() is None:
+                raise HTTPException(status_code=501, detail="Columnar exports need pyarrow (pip install pyarrow)")
+            content = export_columnar(collection, filter_dict, format, limit)
+        elif format == "csv":
+            # CSV needs its columns up front, so the full view falls back to the summary fields
+            columns = DataController.requested_fields(collection, view, fields) or DataController.requested_fields(collection, "summary")
+            columns = ["_id"] + [column for column in columns if column != "_id"]
+            projection = DataController.build_projection(collection, "summary", ",".join(columns))
+            content = export_csv(collection, filter_dict, projection, columns, limit)
+        else:
+            projection = DataController.build_projection(collection, view, fields)
+            content = export_ndjson(collection, filter_dict, projection, limit)
+        
+        media_type, extension = ExportController.FORMATS[format]
+        return StreamingResponse(
+            content,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{collection}.{extension}"'}
+        )
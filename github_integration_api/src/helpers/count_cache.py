@@ -0,0 +1,24 @@
+import hashlib
+from typing import Dict, Any
+from bson import json_util
+from ..config import settings
+from .database import count_documents, get_data_generation
+from .query_cache import TTLCache
+
+count_cache = TTLCache(settings.count_cache_max_entries, settings.count_cache_ttl)
+
+def normalize_filter(filter_dict: Dict[str, Any]) -> str:
+    # Hashed because search filters can carry thousands of _ids
+    return hashlib.sha256(json_util.dumps(filter_dict or {}, sort_keys=True).encode()).hexdigest()
+
+async def cached_count(collection_name: str, user_id: int, filter_dict: Dict[str, Any]) -> int:
+    # Keyed by the user's data generation, so only that user's syncs invalidate their entries
+    key = (collection_name, normalize_filter(filter_dict), await get_data_generation(user_id))
+
+    found, count = count_cache.get(key)
+    if found:
+        return count
+
+    count = await count_documents(collection_name, filter_dict)
+    count_cache.set(key, count)
+    return count
@@ -1,18 +1,70 @@
+import asyncio
 import motor.motor_asyncio
-from typing import Dict, List, Any, Optional
+from pymongo import ReplaceOne, ReturnDocument, IndexModel, WriteConcern, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure, ExecutionTimeout, BulkWriteError
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from typing import Dict, List, Any, Optional, AsyncIterator, Tuple, Callable, Awaitable
 import json
+import re
+import bson
 from bson import ObjectId
+from datetime import datetime
 from ..config import settings
+from .pool_metrics import pool_metrics
 
 class Database:
     client: motor.motor_asyncio.AsyncIOMotorClient = None
     database: motor.motor_asyncio.AsyncIOMotorDatabase = None
+    # API reads of synced data, routed by MONGODB_READ_PREFERENCE
+    reader: motor.motor_asyncio.AsyncIOMotorDatabase = None
+    # Bulk sync writes, acknowledged with MONGODB_SYNC_WRITE_CONCERN
+    sync_writer: motor.motor_asyncio.AsyncIOMotorDatabase = None
 
 db = Database()
 
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+def write_concern_w(value: str):
+    # "1", "0" or "majority"/a tag set name
+    return int(value) if value.isdigit() else value
+
+def client_options() -> Dict[str, Any]:
+    # Explicit options override the same option in MONGODB_URL
+    options = {
+        "maxPoolSize": settings.mongodb_max_pool_size,
+        "minPoolSize": settings.mongodb_min_pool_size,
+        "event_listeners": [pool_metrics]
+    }
+    if settings.mongodb_max_idle_time_ms:
+        options["maxIdleTimeMS"] = settings.mongodb_max_idle_time_ms
+    if settings.mongodb_wait_queue_timeout_ms:
+        options["waitQueueTimeoutMS"] = settings.mongodb_wait_queue_timeout_ms
+    if settings.mongodb_compressors:
+        # PyMongo warns about and skips compressors whose library isn't installed
+        options["compressors"] = settings.mongodb_compressors
+    if settings.mongodb_write_concern:
+        options["w"] = write_concern_w(settings.mongodb_write_concern)
+    return options
+
+def read_preference():
+    mode = READ_PREFERENCES[settings.mongodb_read_preference]
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=settings.mongodb_max_staleness_seconds)
+
 async def connect_to_mongo():
-    db.client = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url)
+    db.client = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url, **client_options())
     db.database = db.client[settings.database_name]
+    db.reader = db.database.with_options(read_preference=read_preference())
+    db.sync_writer = db.database.with_options(
+        write_concern=WriteConcern(w=write_concern_w(settings.mongodb_sync_write_concern))
+    )
 
 async def close_mongo_connection():
     if db.client:
@@ -21,10 +73,19 @@ async def close_mongo_connection():
 async def get_collection(collection_name: str):
     return db.database[collection_name]
 
+async def get_read_collection(collection_name: str):
+    """For API reads that tolerate replication lag; everything else reads the primary."""
+    return (db.reader if db.reader is not None else db.database)[collection_name]
+
+async def get_sync_collection(collection_name: str):
+    return (db.sync_writer if db.sync_writer is not None else db.database)[collection_name]
+
 class JSONEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, ObjectId):
             return str(obj)
+        if isinstance(obj, datetime):
+            return obj.isoformat()
         return super().default(obj)
 
 async def insert_one(collection_name: str, document: Dict[str, Any]) -> str:
@@ -32,10 +93,119 @@ async def insert_one(collection_name: str, document: Dict[str, Any]) -> str:
     result = await collection.insert_one(document)
     return str(result.inserted_id)
 
-async def insert_many(collection_name: str, documents: List[Dict[str, Any]]) -> List[str]:
-    collection = await get_collection(collection_name)
-    result = await collection.insert_many(documents)
-    return [str(id) for id in result.inserted_ids]
+# Bulk writes are split into chunks bounded by MONGODB_BULK_MAX_DOCUMENTS and
+# MONGODB_BULK_MAX_BYTES, sent unordered with MONGODB_BULK_CONCURRENCY chunks in
+# flight, so a large batch keeps several server round trips busy instead of one.
+
+DUPLICATE_KEY_ERROR = 11000
+
+def chunk_documents(documents: List[Dict[str, Any]]) -> List[List[int]]:
+    """Splits documents into chunks of positions, bounded by count and BSON size."""
+    chunks = []
+    chunk = []
+    chunk_bytes = 0
+    for position, document in enumerate(documents):
+        size = len(bson.encode(document))
+        if chunk and (len(chunk) >= settings.mongodb_bulk_max_documents or chunk_bytes + size > settings.mongodb_bulk_max_bytes):
+            chunks.append(chunk)
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(position)
+        chunk_bytes += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+async def write_chunks(chunks: List[Any], write: Callable[[Any], Awaitable[Dict[str, int]]]) -> Dict[str, int]:
+    semaphore = asyncio.Semaphore(settings.mongodb_bulk_concurrency)
+
+    async def run(chunk):
+        async with semaphore:
+            return await write(chunk)
+
+    # Every chunk is allowed to finish before the first failure is raised
+    results = await asyncio.gather(*(run(chunk) for chunk in chunks), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    totals = {"chunks": len(chunks)}
+    for result in results:
+        for key, value in result.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+def duplicate_key_errors(error: BulkWriteError) -> List[Dict[str, Any]]:
+    # Anything other than duplicate keys (validation, write concern) is a real failure
+    write_errors = error.details.get("writeErrors", [])
+    if error.details.get("writeConcernErrors") or any(e["code"] != DUPLICATE_KEY_ERROR for e in write_errors):
+        raise error
+    return write_errors
+
+async def upsert_many(
+    collection_name: str,
+    documents: List[Dict[str, Any]],
+    key_fields: List[str],
+    sync: bool = False
+) -> Dict[str, int]:
+    if not documents:
+        return {"upserted": 0, "modified": 0, "matched": 0, "duplicates": 0, "chunks": 0}
+    
+    collection = await (get_sync_collection if sync else get_collection)(collection_name)
+    operations = [
+        ReplaceOne({field: document.get(field) for field in key_fields}, document, upsert=True)
+        for document in documents
+    ]
+    
+    async def upsert_chunk(chunk: List[ReplaceOne], retry: bool = True) -> Dict[str, int]:
+        try:
+            result = await collection.bulk_write(chunk, ordered=False)
+            return {
+                "upserted": result.upserted_count,
+                "modified": result.modified_count,
+                "matched": result.matched_count,
+                "duplicates": 0
+            }
+        except BulkWriteError as e:
+            duplicates = duplicate_key_errors(e)
+            counts = {
+                "upserted": e.details["nUpserted"],
+                "modified": e.details["nModified"],
+                "matched": e.details["nMatched"],
+                "duplicates": len(duplicates)
+            }
+        # Two writers upserting the same new key race on the unique index and the loser
+        # fails; retried once, its filter matches the winner's document and replaces it
+        if retry and duplicates:
+            retried = await upsert_chunk([chunk[error["index"]] for error in duplicates], retry=False)
+            counts = {key: value + retried[key] for key, value in counts.items()}
+            counts["duplicates"] = retried["duplicates"]
+        return counts
+    
+    chunks = [[operations[position] for position in chunk] for chunk in chunk_documents(documents)]
+    return await write_chunks(chunks, upsert_chunk)
+
+async def sync_write(
+    collection_name: str,
+    documents: List[Dict[str, Any]],
+    key_fields: List[str],
+    generation: int
+) -> Dict[str, int]:
+    # Stamp documents with the sync generation so the ones not seen this time can be swept afterwards
+    for document in documents:
+        document["sync_generation"] = generation
+    return await upsert_many(collection_name, documents, key_fields, sync=True)
+
+async def mark_seen(collection_name: str, filter_dict: Dict[str, Any], generation: int) -> int:
+    # Restamps documents that didn't change, so the sweep after a full sync keeps them
+    collection = await get_sync_collection(collection_name)
+    result = await collection.update_many(filter_dict, {"$set": {"sync_generation": generation}})
+    return result.modified_count
+
+async def delete_unseen(collection_name: str, filter_dict: Dict[str, Any], generation: int) -> int:
+    collection = await get_sync_collection(collection_name)
+    result = await collection.delete_many({**filter_dict, "sync_generation": {"$ne": generation}})
+    return result.deleted_count
 
 async def find_one(collection_name: str, filter_dict: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     collection = await get_collection(collection_name)
@@ -50,33 +220,111 @@ async def find_many(
     skip: int = 0,
     limit: int = 100,
     sort_by: str = None,
-    sort_order: int = 1
+    sort_order: int = 1,
+    sort: List[Tuple[str, int]] = None,
+    projection: Dict[str, Any] = None
 ) -> List[Dict[str, Any]]:
-    collection = await get_collection(collection_name)
+    collection = await get_read_collection(collection_name)
     
-    query = collection.find(filter_dict or {})
+    query = collection.find(filter_dict or {}, projection)
     
-    if sort_by:
+    if sort:
+        query = query.sort(sort)
+    elif sort_by:
         query = query.sort(sort_by, sort_order)
     
     query = query.skip(skip).limit(limit)
     
     documents = []
     async for document in query:
-        document['_id'] = str(document['_id'])
+        if '_id' in document:
+            document['_id'] = str(document['_id'])
         documents.append(document)
     
     return documents
 
-async def count_documents(collection_name: str, filter_dict: Dict[str, Any] = None) -> int:
+async def iter_documents(
+    collection_name: str,
+    filter_dict: Dict[str, Any] = None,
+    projection: Dict[str, Any] = None,
+    batch_size: int = 1000
+) -> AsyncIterator[Dict[str, Any]]:
     collection = await get_collection(collection_name)
+    async for document in collection.find(filter_dict or {}, projection).batch_size(batch_size):
+        if '_id' in document:
+            document['_id'] = str(document['_id'])
+        yield document
+
+async def stream_documents(
+    collection_name: str,
+    filter_dict: Dict[str, Any],
+    projection: Dict[str, Any] = None,
+    sort: List[Tuple[str, int]] = None,
+    limit: int = 0,
+    batch_size: int = 1000
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yields raw documents from a server-side cursor, holding one batch in memory at a time."""
+    collection = await get_read_collection(collection_name)
+    cursor = collection.find(filter_dict, projection, sort=sort, limit=limit, batch_size=batch_size)
+    try:
+        async for document in cursor:
+            yield document
+    finally:
+        # Also runs when a client disconnects mid-export, so the server cursor isn't left open
+        await cursor.close()
+
+async def count_documents(collection_name: str, filter_dict: Dict[str, Any] = None) -> int:
+    collection = await get_read_collection(collection_name)
     return await collection.count_documents(filter_dict or {})
 
+async def aggregate(collection_name: str, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    collection = await get_read_collection(collection_name)
+    documents = []
+    async for document in collection.aggregate(pipeline):
+        if isinstance(document.get('_id'), ObjectId):
+            document['_id'] = str(document['_id'])
+        documents.append(document)
+    return documents
+
+async def estimated_count(collection_name: str) -> int:
+    # Read from collection metadata, so it costs the same for any collection size
+    collection = await get_read_collection(collection_name)
+    return await collection.estimated_document_count()
+
 async def update_one(collection_name: str, filter_dict: Dict[str, Any], update_dict: Dict[str, Any]) -> bool:
     collection = await get_collection(collection_name)
     result = await collection.update_one(filter_dict, {"$set": update_dict})
     return result.modified_count > 0
 
+async def update_many(collection_name: str, filter_dict: Dict[str, Any], update: Dict[str, Any]) -> int:
+    collection = await get_collection(collection_name)
+    result = await collection.update_many(filter_dict, update)
+    return result.modified_count
+
+async def find_one_and_update(
+    collection_name: str,
+    filter_dict: Dict[str, Any],
+    update: Dict[str, Any],
+    upsert: bool = False,
+    sort: Optional[List[Any]] = None
+) -> Optional[Dict[str, Any]]:
+    collection = await get_collection(collection_name)
+    document = await collection.find_one_and_update(
+        filter_dict,
+        update,
+        upsert=upsert,
+        sort=sort,
+        return_document=ReturnDocument.AFTER
+    )
+    if document:
+        document['_id'] = str(document['_id'])
+    return document
+
+async def replace_one(collection_name: str, filter_dict: Dict[str, Any], document: Dict[str, Any], upsert: bool = False) -> bool:
+    collection = await get_collection(collection_name)
+    result = await collection.replace_one(filter_dict, document, upsert=upsert)
+    return result.modified_count > 0 or result.upserted_id is not None
+
 async def delete_one(collection_name: str, filter_dict: Dict[str, Any]) -> bool:
     collection = await get_collection(collection_name)
     result = await collection.delete_one(filter_dict)
@@ -87,37 +335,392 @@ async def delete_many(collection_name: str, filter_dict: Dict[str, Any] = None)
     result = await collection.delete_many(filter_dict or {})
     return result.deleted_count
 
-async def search_across_collections(keyword: str, collections: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+DATA_GENERATION_COLLECTION = "github_data_generation"
+
+# One counter per user, kept apart from github_integration so removing and reconnecting
+# an integration never brings an old generation (and results cached under it) back
+async def bump_data_generation(user_id: int) -> int:
+    """Advances the counter that cached reads of one user's synced data are keyed by."""
+    counter = await find_one_and_update(
+        DATA_GENERATION_COLLECTION,
+        {"_id": user_id},
+        {"$inc": {"generation": 1}},
+        upsert=True
+    )
+    return counter["generation"]
+
+async def bump_all_data_generations() -> int:
+    return await update_many(DATA_GENERATION_COLLECTION, {}, {"$inc": {"generation": 1}})
+
+async def get_data_generation(user_id: int) -> int:
+    # Read like the data it keys: a secondary that hasn't replicated a sync's writes yet
+    # also returns the generation from before them, so stale results aren't cached as new
+    collection = await get_read_collection(DATA_GENERATION_COLLECTION)
+    counter = await collection.find_one({"_id": user_id})
+    return counter["generation"] if counter else 0
+
+# Fields matched by the regex search mode, which callers have to ask for explicitly
+REGEX_SEARCH_FIELDS = ["name", "title", "description", "login", "full_name", "body"]
+
+async def search_collection(
+    collection_name: str,
+    keyword: str,
+    user_id: int,
+    mode: str,
+    projection: Dict[str, Any],
+    limit: int,
+    max_time_ms: int
+) -> List[Dict[str, Any]]:
+    collection = await get_read_collection(collection_name)
+    projection = dict(projection or {})
+
+    if mode == "regex":
+        pattern = re.escape(keyword)
+        query = {
+            "integration_user_id": user_id,
+            "$or": [{field: {"$regex": pattern, "$options": "i"}} for field in REGEX_SEARCH_FIELDS]
+        }
+        cursor = collection.find(query, projection or None)
+    else:
+        query = {"integration_user_id": user_id, "$text": {"$search": keyword}}
+        projection["score"] = {"$meta": "textScore"}
+        cursor = collection.find(query, projection).sort([("score", {"$meta": "textScore"})])
+
+    # maxTimeMS stops the server-side work too, not just our wait for it
+    documents = []
+    async for doc in cursor.limit(limit).max_time_ms(max_time_ms):
+        doc['_id'] = str(doc['_id'])
+        documents.append(doc)
+    return documents
+
+async def search_across_collections(
+    keyword: str,
+    collections: List[str],
+    user_id: int,
+    mode: str = "text",
+    projections: Optional[Dict[str, Dict[str, Any]]] = None,
+    limit: int = 50,
+    deadline: Optional[float] = None,
+    max_time_ms: Optional[int] = None
+) -> Dict[str, Any]:
+    """Searches one user's documents in every collection concurrently, ranking by textScore in text mode.
+
+    Collections that miss the overall deadline or their maxTimeMS are listed under
+    "timed_out" with empty results; other failures (e.g. a text index that is still
+    building) are reported under "errors" instead of switching to a regex scan.
+    """
+    deadline = settings.search_deadline_seconds if deadline is None else deadline
+    max_time_ms = settings.search_max_time_ms if max_time_ms is None else max_time_ms
+
+    tasks = {
+        collection_name: asyncio.create_task(search_collection(
+            collection_name, keyword, user_id, mode, (projections or {}).get(collection_name), limit, max_time_ms
+        ))
+        for collection_name in collections
+    }
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
     results = {}
-    
-    for collection_name in collections:
+    errors = {}
+    timed_out = []
+    for collection_name, task in tasks.items():
+        results[collection_name] = []
+        if task in pending:
+            timed_out.append(collection_name)
+        elif isinstance(task.exception(), ExecutionTimeout):
+            timed_out.append(collection_name)
+        elif isinstance(task.exception(), OperationFailure):
+            errors[collection_name] = str(task.exception())
+            print(f" Search failed on {collection_name}: {task.exception()}")
+        else:
+            results[collection_name] = task.result()
+
+    return {"results": results, "errors": errors, "timed_out": timed_out}
+
+def text_index(weights: Dict[str, int]) -> IndexModel:
+    # language_override points at a field GitHub never sends; the default, "language",
+    # would make MongoDB read a repository's programming language as its stemming language.
+    # The integration_user_id prefix means $text queries must pin a user, which every
+    # search does, and they only read that user's index entries
+    return IndexModel(
+        [("integration_user_id", ASCENDING)] + [(field, TEXT) for field in weights],
+        name="text_search",
+        weights=weights,
+        default_language="english",
+        language_override="text_language"
+    )
+
+# Declarative index spec, applied at startup by ensure_indexes().
+# Every tenant-owned collection is prefixed by integration_user_id so per-user
+# queries, counts and deletes never scan other users' documents. The /data API
+# always pins the user, so user_object_id serves its default _id order and keyset
+# pages as a plain index range.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "github_integration": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True)
+    ],
+    "github_organizations": [
+        IndexModel([("integration_user_id", ASCENDING), ("id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("integration_user_id", ASCENDING), ("login", ASCENDING)], name="user_login"),
+        IndexModel([("integration_user_id", ASCENDING), ("_id", ASCENDING)], name="user_object_id"),
+        text_index({"login": 10, "description": 2})
+    ],
+    "github_users": [
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("organization", ASCENDING), ("id", ASCENDING)],
+            name="user_organization_id_unique",
+            unique=True
+        ),
+        IndexModel([("integration_user_id", ASCENDING), ("login", ASCENDING)], name="user_login"),
+        IndexModel([("integration_user_id", ASCENDING), ("_id", ASCENDING)], name="user_object_id"),
+        text_index({"login": 10})
+    ],
+    "github_repos": [
+        IndexModel([("integration_user_id", ASCENDING), ("id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("integration_user_id", ASCENDING), ("full_name", ASCENDING)], name="user_full_name"),
+        IndexModel([("integration_user_id", ASCENDING), ("created_at", ASCENDING)], name="user_created_at"),
+        IndexModel([("integration_user_id", ASCENDING), ("stargazers_count", DESCENDING)], name="user_stargazers"),
+        IndexModel([("integration_user_id", ASCENDING), ("_id", ASCENDING)], name="user_object_id"),
+        text_index({"name": 10, "full_name": 8, "topics": 4, "description": 3})
+    ],
+    "github_commits": [
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("sha", ASCENDING)],
+            name="user_repository_sha_unique",
+            unique=True
+        ),
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("commit.author.date", DESCENDING)],
+            name="user_repository_date"
+        ),
+        IndexModel([("integration_user_id", ASCENDING), ("commit.author.date", DESCENDING)], name="user_date"),
+        IndexModel([("integration_user_id", ASCENDING), ("author.login", ASCENDING)], name="user_author"),
+        IndexModel([("integration_user_id", ASCENDING), ("_id", ASCENDING)], name="user_object_id"),
+        text_index({"commit.message": 5, "author.login": 3, "commit.author.name": 3})
+    ],
+    "github_pulls": [
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("id", ASCENDING)],
+            name="user_repository_id_unique",
+            unique=True
+        ),
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("created_at", DESCENDING)],
+            name="user_repository_created_at"
+        ),
+        IndexModel([("integration_user_id", ASCENDING), ("state", ASCENDING), ("updated_at", DESCENDING)], name="user_state_updated_at"),
+        IndexModel([("integration_user_id", ASCENDING), ("_id", ASCENDING)], name="user_object_id"),
+        text_index({"title": 10, "user.login": 3, "body": 2})
+    ],
+    "github_issues": [
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("id", ASCENDING)],
+            name="user_repository_id_unique",
+            unique=True
+        ),
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("created_at", DESCENDING)],
+            name="user_repository_created_at"
+        ),
+        IndexModel([("integration_user_id", ASCENDING), ("state", ASCENDING), ("updated_at", DESCENDING)], name="user_state_updated_at"),
+        IndexModel([("integration_user_id", ASCENDING), ("_id", ASCENDING)], name="user_object_id"),
+        text_index({"title": 10, "user.login": 3, "body": 2})
+    ],
+    "github_changelogs": [
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("id", ASCENDING)],
+            name="user_repository_id_unique",
+            unique=True
+        ),
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("created_at", DESCENDING)],
+            name="user_repository_created_at"
+        ),
+        IndexModel([("integration_user_id", ASCENDING), ("_id", ASCENDING)], name="user_object_id"),
+        text_index({"event": 5, "actor.login": 3})
+    ],
+    "github_sync_state": [
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("resource", ASCENDING)],
+            name="user_repository_resource_unique",
+            unique=True
+        )
+    ],
+    "github_search_index": [
+        IndexModel([("integration_user_id", ASCENDING), ("collection", ASCENDING)], name="user_collection"),
+        IndexModel([("document_id", ASCENDING)], name="document_id"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at")
+    ],
+    "github_rollup_author_weeks": [
+        # Also the key $merge matches rollup rows on
+        IndexModel(
+            [("integration_user_id", ASCENDING), ("repository", ASCENDING), ("author", ASCENDING), ("week", ASCENDING)],
+            name="user_repository_author_week_unique",
+            unique=True
+        ),
+        IndexModel([("integration_user_id", ASCENDING), ("author", ASCENDING), ("week", ASCENDING)], name="user_author_week")
+    ],
+    "github_rollup_repositories": [
+        IndexModel([("integration_user_id", ASCENDING), ("repository", ASCENDING)], name="user_repository_unique", unique=True)
+    ],
+    "github_rollup_dirty": [
+        IndexModel([("integration_user_id", ASCENDING), ("repository", ASCENDING)], name="user_repository_unique", unique=True)
+    ],
+    "github_http_cache": [
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=settings.github_cache_ttl),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("token", ASCENDING)], name="token")
+    ],
+    "github_query_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)
+    ],
+    "github_sync_jobs": [
+        # At most one queued/running job per user; a second request attaches to it
+        IndexModel(
+            [("user_id", ASCENDING)],
+            name="user_id_active_unique",
+            unique=True,
+            partialFilterExpression={"active": True}
+        ),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at")
+    ]
+}
+
+# Options that change what an index does; anything else (e.g. background) is build-time only
+INDEX_OPTIONS = ["unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "weights", "default_language", "language_override"]
+
+class IndexState:
+    last_report: Dict[str, Any] = None
+
+index_state = IndexState()
+
+def _index_signature(index: Dict[str, Any]) -> Dict[str, Any]:
+    key = index["key"]
+    key = list(key.items()) if hasattr(key, "items") else list(key)
+    options = {option: index[option] for option in INDEX_OPTIONS if option in index}
+
+    # MongoDB reports text indexes as _fts/_ftsx keys with the fields moved into
+    # weights, so declared text fields are folded the same way before comparing
+    normalized_key = []
+    weights = dict(options.get("weights") or {})
+    for field, direction in key:
+        if direction == TEXT and field != "_fts":
+            weights.setdefault(field, 1)
+            if ["_fts", TEXT] not in normalized_key:
+                normalized_key += [["_fts", TEXT], ["_ftsx", 1]]
+            continue
+        # Indexes created from the shell report directions as doubles
+        if isinstance(direction, float):
+            direction = int(direction)
+        normalized_key.append([field, direction])
+    if weights:
+        options["weights"] = {field: int(weight) for field, weight in sorted(weights.items())}
+
+    return {"key": normalized_key, **options}
+
+async def get_index_report() -> Dict[str, Any]:
+    """Compares the declared indexes with the ones that exist in MongoDB."""
+    report = {}
+
+    for collection_name, models in INDEXES.items():
         collection = await get_collection(collection_name)
-        
-        query = {"$text": {"$search": keyword}}
-        
-        try:
-            documents = []
-            async for doc in collection.find(query).limit(50):
-                doc['_id'] = str(doc['_id'])
-                documents.append(doc)
-            results[collection_name] = documents
-        except:
-    
-            regex_query = {
-                "$or": [
-                    {"name": {"$regex": keyword, "$options": "i"}},
-                    {"title": {"$regex": keyword, "$options": "i"}},
-                    {"description": {"$regex": keyword, "$options": "i"}},
-                    {"login": {"$regex": keyword, "$options": "i"}},
-                    {"full_name": {"$regex": keyword, "$options": "i"}},
-                    {"body": {"$regex": keyword, "$options": "i"}}
-                ]
-            }
-            
-            documents = []
-            async for doc in collection.find(regex_query).limit(50):
-                doc['_id'] = str(doc['_id'])
-                documents.append(doc)
-            results[collection_name] = documents
-    
-    return results
+        existing = await collection.index_information()
+        existing_signatures = {name: _index_signature(info) for name, info in existing.items()}
+
+        entry = {"present": [], "missing": [], "conflicts": [], "extra": []}
+        for model in models:
+            spec = model.document
+            name = spec["name"]
+            signature = _index_signature(spec)
+
+            if name not in existing_signatures:
+                entry["missing"].append({"name": name, **signature})
+            elif existing_signatures[name] != signature:
+                entry["conflicts"].append({"name": name, "expected": signature, "actual": existing_signatures[name]})
+            else:
+                entry["present"].append(name)
+
+        declared = {model.document["name"] for model in INDEXES[collection_name]}
+        entry["extra"] = [name for name in existing_signatures if name != "_id_" and name not in declared]
+        report[collection_name] = entry
+
+    return report
+
+async def remove_duplicate_keys(collection_name: str, fields: List[str]) -> int:
+    """Deletes all but the most recently synced document of each duplicated key, so a unique index can be built.
+
+    Older syncs inserted repositories from both /user/repos and the organization listings,
+    which leaves duplicate (integration_user_id, id) rows behind.
+    """
+    collection = await get_collection(collection_name)
+    pipeline = [
+        {"$sort": {"sync_generation": -1, "_id": -1}},
+        {"$group": {"_id": {field.replace(".", "_"): f"${field}" for field in fields}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    duplicate_ids = []
+    async for group in collection.aggregate(pipeline, allowDiskUse=True):
+        duplicate_ids.extend(group["ids"][1:])
+
+    removed = 0
+    for start in range(0, len(duplicate_ids), 1000):
+        batch = duplicate_ids[start:start + 1000]
+        result = await collection.delete_many({"_id": {"$in": batch}})
+        removed += result.deleted_count
+        # Tombstoned like search_index.remove_from_index, so loaded indexes drop them on refresh
+        search_entries = await get_collection("github_search_index")
+        await search_entries.update_many(
+            {"document_id": {"$in": batch}, "deleted": False},
+            {"$set": {"deleted": True, "updated_at": datetime.utcnow()}, "$unset": {"text": ""}}
+        )
+    return removed
+
+async def ensure_indexes(drop_conflicting: bool = False) -> Dict[str, Any]:
+    """Creates missing indexes; safe to run on every startup.
+
+    Indexes whose definition changed are only rebuilt when drop_conflicting is set,
+    since dropping an index on a large collection is not something to do silently.
+    Duplicates that would block a unique index are removed first, and any failure is
+    recorded in the report (kept for GET /admin/indexes) instead of being raised.
+    """
+    report = await get_index_report()
+
+    for collection_name, entry in report.items():
+        collection = await get_collection(collection_name)
+        models = {model.document["name"]: model for model in INDEXES[collection_name]}
+        entry["created"] = []
+        entry["deduplicated"] = {}
+        entry["errors"] = []
+
+        to_build = [index["name"] for index in entry["missing"]]
+        if drop_conflicting:
+            for conflict in entry["conflicts"]:
+                try:
+                    await collection.drop_index(conflict["name"])
+                    to_build.append(conflict["name"])
+                except Exception as e:
+                    entry["errors"].append({"name": conflict["name"], "error": str(e)})
+
+        for name in to_build:
+            model = models[name]
+            try:
+                if model.document.get("unique"):
+                    removed = await remove_duplicate_keys(collection_name, list(model.document["key"].keys()))
+                    if removed:
+                        entry["deduplicated"][name] = removed
+                        print(f" Removed {removed} duplicate(s) blocking {collection_name}.{name}")
+                await collection.create_index(
+                    model.document["key"].items(),
+                    background=True,
+                    **{key: value for key, value in model.document.items() if key != "key"}
+                )
+                entry["created"].append(name)
+            except Exception as e:
+                entry["errors"].append({"name": name, "error": str(e)})
+                print(f" Failed to build index {collection_name}.{name}: {e}")
+
+    index_state.last_report = report
+    return report
@@ -0,0 +1,237 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Dict, List, Any, Optional, AsyncIterator
+from ..config import settings
+from .database import stream_documents, JSONEncoder
+from .pagination import get_field
+
+# Exports stream documents from a cursor in _id order and hand the response one
+# encoded chunk per EXPORT_BATCH_SIZE documents, so memory stays flat no matter
+# how many rows are exported.
+
+def encode_json(value: Any) -> str:
+    return json.dumps(value, cls=JSONEncoder, separators=(",", ":"))
+
+def csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return encode_json(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def export_ndjson(
+    collection: str,
+    filter_dict: Dict[str, Any],
+    projection: Optional[Dict[str, Any]],
+    limit: int = 0
+) -> AsyncIterator[str]:
+    lines = []
+    async for document in stream_documents(
+        collection, filter_dict, projection, sort=[("_id", 1)], limit=limit, batch_size=settings.export_batch_size
+    ):
+        lines.append(encode_json(document))
+        if len(lines) >= settings.export_batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+async def export_csv(
+    collection: str,
+    filter_dict: Dict[str, Any],
+    projection: Dict[str, Any],
+    columns: List[str],
+    limit: int = 0
+) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    rows = 0
+    async for document in stream_documents(
+        collection, filter_dict, projection, sort=[("_id", 1)], limit=limit, batch_size=settings.export_batch_size
+    ):
+        writer.writerow([csv_value(get_field(document, column)) for column in columns])
+        rows += 1
+        if rows % settings.export_batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+# Columnar exports flatten each supported collection to a fixed schema of scalar
+# columns. Each column is (name, type, source), where source is a dotted field path
+# or a function of the document; "fields" is the projection read from MongoDB.
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def text_length(path: str):
+    return lambda document: len(get_field(document, path) or "")
+
+def timestamp_of(path: str):
+    return lambda document: parse_timestamp(get_field(document, path))
+
+COLUMNAR_EXPORTS = {
+    "github_commits": {
+        "fields": ["repository", "sha", "author.login", "commit.author", "commit.message", "parents"],
+        "columns": [
+            ("repository", "string", "repository"),
+            ("sha", "string", "sha"),
+            ("author", "string", lambda document: get_field(document, "author.login") or get_field(document, "commit.author.email")),
+            ("author_name", "string", "commit.author.name"),
+            ("authored_at", "timestamp", timestamp_of("commit.author.date")),
+            ("message_length", "int64", text_length("commit.message")),
+            ("parent_count", "int64", lambda document: len(document.get("parents") or []))
+        ]
+    },
+    "github_pulls": {
+        "fields": ["repository", "number", "state", "user.login", "title", "created_at", "updated_at", "closed_at", "merged_at"],
+        "columns": [
+            ("repository", "string", "repository"),
+            ("number", "int64", "number"),
+            ("state", "string", "state"),
+            ("author", "string", "user.login"),
+            ("title_length", "int64", text_length("title")),
+            ("created_at", "timestamp", timestamp_of("created_at")),
+            ("updated_at", "timestamp", timestamp_of("updated_at")),
+            ("closed_at", "timestamp", timestamp_of("closed_at")),
+            ("merged_at", "timestamp", timestamp_of("merged_at"))
+        ]
+    },
+    "github_issues": {
+        "fields": ["repository", "number", "state", "user.login", "title", "comments", "created_at", "updated_at", "closed_at"],
+        "columns": [
+            ("repository", "string", "repository"),
+            ("number", "int64", "number"),
+            ("state", "string", "state"),
+            ("author", "string", "user.login"),
+            ("title_length", "int64", text_length("title")),
+            ("comments", "int64", "comments"),
+            ("created_at", "timestamp", timestamp_of("created_at")),
+            ("updated_at", "timestamp", timestamp_of("updated_at")),
+            ("closed_at", "timestamp", timestamp_of("closed_at"))
+        ]
+    },
+    "github_repos": {
+        "fields": [
+            "full_name", "primary_language", "private", "fork", "archived", "size",
+            "stargazers_count", "forks_count", "open_issues_count", "created_at", "pushed_at"
+        ],
+        "columns": [
+            ("repository", "string", "full_name"),
+            ("language", "string", "primary_language"),
+            ("private", "bool", "private"),
+            ("fork", "bool", "fork"),
+            ("archived", "bool", "archived"),
+            ("size_kb", "int64", "size"),
+            ("stars", "int64", "stargazers_count"),
+            ("forks", "int64", "forks_count"),
+            ("open_issues", "int64", "open_issues_count"),
+            ("created_at", "timestamp", timestamp_of("created_at")),
+            ("pushed_at", "timestamp", timestamp_of("pushed_at"))
+        ]
+    }
+}
+
+def load_pyarrow():
+    # Optional dependency, only needed for columnar exports
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return None
+    return pyarrow
+
+def arrow_schema(pa, collection: str):
+    types = {"string": pa.string(), "int64": pa.int64(), "bool": pa.bool_(), "timestamp": pa.timestamp("us", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind, _ in COLUMNAR_EXPORTS[collection]["columns"]])
+
+class ChunkSink:
+    """Write-only file that hands written bytes back to the caller instead of keeping them."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet records absolute offsets, so this counts everything ever written
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+async def export_columnar(
+    collection: str,
+    filter_dict: Dict[str, Any],
+    format: str = "parquet",
+    limit: int = 0
+) -> AsyncIterator[bytes]:
+    """Streams a collection as Parquet (or an Arrow IPC stream), one row group per EXPORT_ROW_GROUP_SIZE rows.
+
+    Only the current row group is held in memory; its bytes are yielded as soon as
+    it is written, and the Parquet footer comes last.
+    """
+    pa = load_pyarrow()
+    export = COLUMNAR_EXPORTS[collection]
+    schema = arrow_schema(pa, collection)
+    sources = [source for _, _, source in export["columns"]]
+
+    sink = ChunkSink()
+    if format == "parquet":
+        writer = pa.parquet.ParquetWriter(
+            pa.PythonFile(sink, mode="w"), schema, compression=settings.export_parquet_compression
+        )
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+
+    def write_row_group(values: List[List[Any]]) -> None:
+        # Runs in a thread: building arrays and compressing is CPU-bound
+        arrays = [pa.array(column, type=field.type) for column, field in zip(values, schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+    values = [[] for _ in sources]
+    try:
+        async for document in stream_documents(
+            collection,
+            filter_dict,
+            {field: 1 for field in export["fields"]},
+            sort=[("_id", 1)],
+            limit=limit,
+            batch_size=settings.export_batch_size
+        ):
+            for column, source in zip(values, sources):
+                column.append(source(document) if callable(source) else get_field(document, source))
+            if len(values[0]) >= settings.export_row_group_size:
+                await asyncio.to_thread(write_row_group, values)
+                values = [[] for _ in sources]
+                yield sink.drain()
+        if values[0]:
+            await asyncio.to_thread(write_row_group, values)
+    finally:
+        writer.close()
+    yield sink.drain()
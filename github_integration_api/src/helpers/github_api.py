@@ -1,30 +1,280 @@
+import asyncio
 import httpx
-from typing import Dict, List, Any, Optional
+import json
+import re
+import time
+import urllib.parse
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Any, Optional, Tuple, AsyncIterator
 from ..config import settings
+from .rate_limiter import get_rate_limiter, backoff_delay, RateLimitExceeded, token_key
+from .response_cache import cache_key, conditional_headers, get_cached_response, touch_response, store_response
+
+# Statuses GitHub answers a listing's first page with when there is nothing to list:
+# 404 for a repository that is gone or no longer visible, 409 for an empty repository
+EMPTY_LISTING_STATUSES = (404, 409)
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as seconds or as an HTTP-date (RFC 9110)."""
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+class GitHubAPIError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        self.status_code = status_code
+        super().__init__(message)
+
+def parse_last_page(link_header: Optional[str]) -> Optional[int]:
+    """Page number of the rel="last" entry in a GitHub Link header."""
+    if not link_header:
+        return None
+    for part in link_header.split(","):
+        match = re.search(r'<([^>]+)>;\s*rel="last"', part)
+        if match:
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(match.group(1)).query)
+            if "page" in query:
+                return int(query["page"][0])
+    return None
+
+class GitHubHTTPClient:
+    client: httpx.AsyncClient = None
+
+http_client = GitHubHTTPClient()
+
+def _build_http_client() -> httpx.AsyncClient:
+    http2 = settings.github_http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print(" h2 is not installed, GitHub client falling back to HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.github_max_connections,
+            max_keepalive_connections=settings.github_max_keepalive_connections,
+            keepalive_expiry=settings.github_keepalive_expiry
+        ),
+        timeout=httpx.Timeout(
+            settings.github_read_timeout,
+            connect=settings.github_connect_timeout,
+            pool=settings.github_pool_timeout
+        )
+    )
+
+async def open_github_client():
+    if http_client.client is None:
+        http_client.client = _build_http_client()
+
+async def close_github_client():
+    if http_client.client is not None:
+        await http_client.client.aclose()
+        http_client.client = None
+
+def get_github_client() -> httpx.AsyncClient:
+    # Scripts that use GitHubAPI outside the app lifespan get a lazily created client
+    if http_client.client is None:
+        http_client.client = _build_http_client()
+    return http_client.client
 
 class GitHubAPI:
-    def __init__(self, access_token: str):
+    def __init__(self, access_token: str, user_id: Optional[int] = None):
         self.access_token = access_token
-        self.base_url = "https://api.github.com"
+        self.user_id = user_id
+        self.base_url = settings.github_api_url.rstrip("/")
         self.headers = {
             "Authorization": f"Bearer {access_token}",
             "Accept": "application/vnd.github.v3+json",
             "User-Agent": "GitHub-Integration-API"
         }
+        self.token_key = token_key(access_token)
+        self.rate_limiter = get_rate_limiter(access_token)
+        self.cache_stats = {"hits": 0, "misses": 0}
+
+    def _rate_limit_wait(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """Seconds to back off if the response is a primary or secondary rate limit, else None."""
+        if response.status_code not in (403, 429):
+            return None
+
+        # An unparseable Retry-After falls through to the reset header
+        retry_after = parse_retry_after(response.headers.get("retry-after") or "")
+        if retry_after is not None:
+            return retry_after + backoff_delay(0)
+
+        if response.headers.get("x-ratelimit-remaining") == "0":
+            reset = float(response.headers.get("x-ratelimit-reset", time.time()))
+            return max(reset - time.time(), 0) + 1
+
+        if response.status_code == 429 or "rate limit" in response.text.lower():
+            # Secondary limits without Retry-After: GitHub asks for at least a minute
+            return settings.github_secondary_limit_wait + backoff_delay(attempt)
+
+        return None
 
     async def make_request(self, endpoint: str, params: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
-        async with httpx.AsyncClient() as client:
+        data, _ = await self._request(endpoint, params)
+        return data
+
+    async def _request(
+        self,
+        endpoint: str,
+        params: Dict[str, Any] = None,
+        strict: bool = False
+    ) -> Tuple[Optional[Any], Optional[str]]:
+        """Returns the decoded body and the Link header of a GET request.
+
+        Errors that retrying can't fix return (None, None), or raise GitHubAPIError when
+        strict is set, so a paginated listing can't mistake a failed page for an empty one.
+        """
+        client = get_github_client()
+        url = f"{self.base_url}{endpoint}"
+        last_error = None
+
+        key = cache_key(self.token_key, url, params)
+        cached = await get_cached_response(key)
+        headers = {**self.headers, **conditional_headers(cached)} if cached else self.headers
+
+        for attempt in range(settings.github_max_retries + 1):
+            if attempt:
+                self.rate_limiter.retries += 1
+
+            try:
+                await self.rate_limiter.acquire()
+            except RateLimitExceeded as e:
+                raise GitHubAPIError(f"Request to {endpoint} not sent: {e}", status_code=429)
+
+            try:
+                async with self.rate_limiter.concurrency:
+                    response = await client.get(
+                        url,
+                        headers=headers,
+                        params=params or {}
+                    )
+            except httpx.TransportError as e:
+                last_error = f"{type(e).__name__}: {e}"
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+
+            self.rate_limiter.update(response.headers)
+
+            wait = self._rate_limit_wait(response, attempt)
+            if wait is not None:
+                last_error = f"rate limited ({response.status_code})"
+                print(f"Rate limited on {endpoint}, retrying in {wait:.1f}s")
+                self.rate_limiter.block_for(wait)
+                continue
+
+            if response.status_code >= 500:
+                last_error = f"server error ({response.status_code})"
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+
+            if response.status_code == 304 and cached:
+                # Not modified: served from cache and not charged against the rate limit
+                self.cache_stats["hits"] += 1
+                await touch_response(key)
+                return json.loads(cached["body"]), cached.get("link")
+
             try:
-                response = await client.get(
-                    f"{self.base_url}{endpoint}",
-                    headers=self.headers,
-                    params=params or {}
-                )
                 response.raise_for_status()
-                return response.json()
+                data = response.json()
             except Exception as e:
+                if strict and response.is_error:
+                    raise GitHubAPIError(f"Request to {endpoint} failed with status {response.status_code}", status_code=response.status_code)
+                if strict:
+                    raise GitHubAPIError(f"Request to {endpoint} returned an invalid body: {e}", status_code=502)
                 print(f"Error making request to {endpoint}: {e}")
-                return None
+                return None, None
+
+            self.cache_stats["misses"] += 1
+            await store_response(key, self.token_key, self.user_id, url, response)
+            return data, response.headers.get("link")
+
+        # Surface the failure so callers don't mistake a throttled page for the end of the data
+        raise GitHubAPIError(
+            f"Request to {endpoint} failed after {settings.github_max_retries + 1} attempts: {last_error}",
+            status_code=503
+        )
+
+    async def iter_pages(
+        self,
+        endpoint: str,
+        params: Dict[str, Any] = None,
+        per_page: int = 100,
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yields pages in order; after page 1 the next pages up to rel="last" are prefetched concurrently.
+
+        Any page that can't be fetched raises GitHubAPIError, except a 404 or 409 on page 1,
+        which GitHub returns for a listing that has nothing in it (e.g. an empty repository).
+        """
+        params = {**(params or {}), "per_page": per_page}
+
+        try:
+            first_page, link = await self._request(endpoint, {**params, "page": 1}, strict=True)
+        except GitHubAPIError as e:
+            if e.status_code in EMPTY_LISTING_STATUSES:
+                return
+            raise
+        if first_page is None:
+            raise GitHubAPIError(f"Page 1 of {endpoint} returned no data", status_code=502)
+        if not first_page:
+            return
+        yield first_page
+
+        last_page = parse_last_page(link)
+        if not last_page or last_page <= 1:
+            return
+
+        # At most GITHUB_PAGE_CONCURRENCY pages are in flight or buffered, so memory
+        # depends on the page size and not on how many pages the resource has
+        concurrency = concurrency or settings.github_page_concurrency
+        pending = deque()
+        next_page = 2
+        try:
+            while next_page <= last_page or pending:
+                while next_page <= last_page and len(pending) < concurrency:
+                    pending.append((next_page, asyncio.create_task(
+                        self._request(endpoint, {**params, "page": next_page}, strict=True)
+                    )))
+                    next_page += 1
+                number, task = pending.popleft()
+                page, _ = await task
+                if page is None:
+                    raise GitHubAPIError(f"Page {number} of {endpoint} returned no data", status_code=502)
+                if page:
+                    yield page
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        total = self.cache_stats["hits"] + self.cache_stats["misses"]
+        return {
+            **self.cache_stats,
+            "hit_ratio": round(self.cache_stats["hits"] / total, 4) if total else 0.0
+        }
+
+    def get_rate_limit_state(self) -> Dict[str, Any]:
+        return self.rate_limiter.get_state()
+
+    async def refresh_rate_limit(self) -> Dict[str, Any]:
+        # GET /rate_limit does not count against the budget
+        await self.make_request("/rate_limit")
+        return self.get_rate_limit_state()
 
     async def get_user_info(self) -> Optional[Dict[str, Any]]:
         return await self.make_request("/user")
@@ -39,6 +289,29 @@ class GitHubAPI:
         return []
 
 
+    async def list_all(self, pages: AsyncIterator[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        items = []
+        async for page in pages:
+            items.extend(page)
+        return items
+
+    async def list_user_organizations(self) -> List[Dict[str, Any]]:
+        # Unlike get_user_organizations, a failed request raises instead of reading as "no organizations"
+        orgs = await self.list_all(self.iter_pages("/user/orgs"))
+        if orgs:
+            return orgs
+        user_info, _ = await self._request("/user", strict=True)
+        return await self.list_all(self.iter_pages(f"/users/{user_info['login']}/orgs"))
+
+    def iter_user_repos(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        return self.iter_pages("/user/repos")
+
+    def iter_organization_repos(self, org: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        return self.iter_pages(f"/orgs/{org}/repos")
+
+    def iter_organization_members(self, org: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        return self.iter_pages(f"/orgs/{org}/members")
+
     async def get_organization_repos(self, org: str, page: int = 1, per_page: int = 100) -> List[Dict[str, Any]]:
         params = {"page": page, "per_page": per_page}
         result = await self.make_request(f"/orgs/{org}/repos", params)
@@ -69,27 +342,58 @@ class GitHubAPI:
         result = await self.make_request(f"/repos/{owner}/{repo}/issues/events", params)
         return result if result else []
 
+    def iter_repository_commits(self, owner: str, repo: str, since: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        params = {"since": since} if since else {}
+        return self.iter_pages(f"/repos/{owner}/{repo}/commits", params)
+
+    def iter_repository_pulls(
+        self,
+        owner: str,
+        repo: str,
+        state: str = "all",
+        sort: Optional[str] = None,
+        direction: Optional[str] = None,
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        # The pulls endpoint has no `since`; callers sort by `updated` and stop early instead
+        params = {"state": state}
+        if sort:
+            params["sort"] = sort
+        if direction:
+            params["direction"] = direction
+        return self.iter_pages(f"/repos/{owner}/{repo}/pulls", params, concurrency=concurrency)
+
+    def iter_repository_issues(self, owner: str, repo: str, state: str = "all", since: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        params = {"state": state}
+        if since:
+            params.update({"since": since, "sort": "updated", "direction": "asc"})
+        return self.iter_pages(f"/repos/{owner}/{repo}/issues", params)
+
+    def iter_repository_issue_events(self, owner: str, repo: str, concurrency: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        # Events are returned newest first
+        return self.iter_pages(f"/repos/{owner}/{repo}/issues/events", concurrency=concurrency)
+
     async def get_organization_members(self, org: str, page: int = 1, per_page: int = 100) -> List[Dict[str, Any]]:
         params = {"page": page, "per_page": per_page}
         result = await self.make_request(f"/orgs/{org}/members", params)
         return result if result else []
 
 async def exchange_code_for_token(code: str) -> Optional[str]:
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                "https://github.com/login/oauth/access_token",
-                data={
-                    "client_id": settings.github_client_id,
-                    "client_secret": settings.github_client_secret,
-                    "code": code,
-                    "redirect_uri": settings.github_redirect_uri
-                },
-                headers={"Accept": "application/json"}
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data.get("access_token")
-        except Exception as e:
-            print(f"Error exchanging code for token: {e}")
-            return None
+    client = get_github_client()
+    try:
+        response = await client.post(
+            "https://github.com/login/oauth/access_token",
+            data={
+                "client_id": settings.github_client_id,
+                "client_secret": settings.github_client_secret,
+                "code": code,
+                "redirect_uri": settings.github_redirect_uri
+            },
+            headers={"Accept": "application/json"}
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data.get("access_token")
+    except Exception as e:
+        print(f"Error exchanging code for token: {e}")
+        return None
@@ -0,0 +1,71 @@
+import base64
+from typing import Dict, List, Any, Optional, Tuple
+from bson import ObjectId, json_util
+
+# Keyset pagination: a cursor records the sort value and _id of the last (or first)
+# document of a page, and the next page is the range after it. Unlike skip(), the
+# cost does not grow with the page number and rows don't shift when data changes.
+
+def sort_field(sort_by: Optional[str]) -> Optional[str]:
+    # _id is always the tiebreaker, so sorting by it needs no separate field
+    return sort_by if sort_by and sort_by != "_id" else None
+
+def sort_spec(sort_by: Optional[str], sort_order: int) -> List[Tuple[str, int]]:
+    field = sort_field(sort_by)
+    return [(field, sort_order), ("_id", sort_order)] if field else [("_id", sort_order)]
+
+def get_field(document: Dict[str, Any], path: str) -> Any:
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def encode_cursor(collection: str, sort_by: Optional[str], sort_order: int, document: Dict[str, Any], direction: str) -> str:
+    field = sort_field(sort_by)
+    document_id = document["_id"]
+    if isinstance(document_id, str) and ObjectId.is_valid(document_id):
+        document_id = ObjectId(document_id)
+
+    # json_util keeps ObjectId and datetime values typed through the round trip
+    payload = json_util.dumps({
+        "c": collection,
+        "s": field,
+        "o": sort_order,
+        "d": direction,
+        "k": get_field(document, field) if field else None,
+        "i": document_id
+    })
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> Optional[Dict[str, Any]]:
+    try:
+        payload = json_util.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, dict) or not {"c", "s", "o", "d", "k", "i"} <= payload.keys():
+        return None
+    if payload["d"] not in ("next", "prev"):
+        return None
+    return payload
+
+def keyset_filter(sort_by: Optional[str], ascending: bool, value: Any, last_id: Any) -> Dict[str, Any]:
+    """Matches the documents that come after (value, last_id) in the given direction."""
+    after = "$gt" if ascending else "$lt"
+    id_after = {"_id": {after: last_id}}
+
+    field = sort_field(sort_by)
+    if not field:
+        return id_after
+
+    # MongoDB sorts null and missing values before everything else, and range
+    # operators never match them, so they need their own clauses
+    if value is None:
+        ties = {field: None, **id_after}
+        return {"$or": [ties, {field: {"$ne": None}}]} if ascending else ties
+
+    clauses = [{field: {after: value}}, {field: value, **id_after}]
+    if not ascending:
+        clauses.append({field: None})
+    return {"$or": clauses}
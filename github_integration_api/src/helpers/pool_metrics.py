@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+from pymongo import monitoring
+
+# MongoDB connection pool metrics. Motor runs PyMongo in executor threads and a
+# checkout starts and completes on the same thread, so the wait is timed with a
+# thread-local start time. Counts are per process.
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+
+    def __init__(self, window: int = 1024):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.servers: Dict[str, Dict[str, Any]] = {}
+        self.window = window
+
+    def server(self, address) -> Dict[str, Any]:
+        key = f"{address[0]}:{address[1]}"
+        stats = self.servers.get(key)
+        if stats is None:
+            stats = self.servers[key] = {
+                "connections": 0,
+                "checked_out": 0,
+                "checkouts": 0,
+                "checkout_failures": {},
+                "wait_total_ms": 0.0,
+                "wait_max_ms": 0.0,
+                "recent_waits_ms": deque(maxlen=self.window),
+                "pool_clears": 0
+            }
+        return stats
+
+    def connection_check_out_started(self, event):
+        self.local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self.local, "started", None)
+        wait_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        self.local.started = None
+        with self.lock:
+            stats = self.server(event.address)
+            stats["checkouts"] += 1
+            stats["checked_out"] += 1
+            stats["wait_total_ms"] += wait_ms
+            stats["wait_max_ms"] = max(stats["wait_max_ms"], wait_ms)
+            stats["recent_waits_ms"].append(wait_ms)
+
+    def connection_check_out_failed(self, event):
+        self.local.started = None
+        with self.lock:
+            failures = self.server(event.address)["checkout_failures"]
+            failures[event.reason] = failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.server(event.address)["checked_out"] -= 1
+
+    def connection_created(self, event):
+        with self.lock:
+            self.server(event.address)["connections"] += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.server(event.address)["connections"] -= 1
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.server(event.address)["pool_clears"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        # The listeners run on pymongo's threads, so the mutable parts are copied under the lock
+        with self.lock:
+            servers = {
+                address: {
+                    **stats,
+                    "recent_waits_ms": list(stats["recent_waits_ms"]),
+                    "checkout_failures": dict(stats["checkout_failures"])
+                }
+                for address, stats in self.servers.items()
+            }
+
+        for stats in servers.values():
+            waits = sorted(stats.pop("recent_waits_ms"))
+            checkouts = stats["checkouts"]
+            stats["wait_avg_ms"] = round(stats["wait_total_ms"] / checkouts, 3) if checkouts else 0.0
+            stats["wait_max_ms"] = round(stats["wait_max_ms"], 3)
+            del stats["wait_total_ms"]
+            # Percentiles over the most recent checkouts, so they reflect current load
+            for name, quantile in (("wait_p50_ms", 0.5), ("wait_p95_ms", 0.95), ("wait_p99_ms", 0.99)):
+                stats[name] = round(waits[min(len(waits) - 1, int(len(waits) * quantile))], 3) if waits else 0.0
+        return servers
+
+pool_metrics = PoolMetrics()
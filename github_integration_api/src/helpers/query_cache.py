@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable
+from bson import json_util
+from ..config import settings
+from .database import find_one, replace_one, delete_many, get_data_generation
+
+# Result cache for the read API. Synced data only changes when a sync runs, so entries
+# are keyed by the data generation (bumped when a sync starts and ends, and when an
+# integration is removed) and never need explicit invalidation; the TTL only bounds
+# how long unused entries hold memory.
+
+QUERY_CACHE_COLLECTION = "github_query_cache"
+
+class TTLCache:
+    """Bounded in-process LRU with per-entry expiry and a byte budget."""
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Any, Tuple[Any, float, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Any) -> Tuple[bool, Any]:
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                self.discard(key)
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return True, entry[0]
+
+    def set(self, key: Any, value: Any, size: int = 0) -> None:
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self.discard(key)
+        self.entries[key] = (value, time.monotonic() + self.ttl, size)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def discard(self, key: Any) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+query_cache = TTLCache(
+    settings.query_cache_max_entries,
+    settings.query_cache_ttl,
+    settings.query_cache_max_bytes
+)
+
+class InFlight:
+    tasks: Dict[str, asyncio.Task] = {}
+    started = 0
+    coalesced = 0
+
+in_flight = InFlight()
+
+async def coalesce(key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """Runs compute once for all concurrent callers with the same key (single flight)."""
+    task = in_flight.tasks.get(key)
+    if task is None:
+        in_flight.started += 1
+        task = asyncio.ensure_future(compute())
+        in_flight.tasks[key] = task
+        task.add_done_callback(lambda _: in_flight.tasks.pop(key, None))
+    else:
+        in_flight.coalesced += 1
+    # Shielded so a caller that disconnects doesn't cancel the query the others are waiting on
+    return await asyncio.shield(task)
+
+def query_key(namespace: str, params: Dict[str, Any], generation: int) -> str:
+    normalized = json_util.dumps(params, sort_keys=True)
+    return hashlib.sha256(f"{namespace}|{generation}|{normalized}".encode()).hexdigest()
+
+async def get_shared(key: str) -> Tuple[bool, Any]:
+    entry = await find_one(QUERY_CACHE_COLLECTION, {"_id": key})
+    # The TTL index removes expired entries lazily, so expiry is checked here as well
+    if entry is None or entry["expires_at"] <= datetime.utcnow():
+        query_cache.misses += 1
+        return False, None
+    query_cache.hits += 1
+    return True, json_util.loads(entry["value"])
+
+async def set_shared(key: str, encoded: str) -> None:
+    await replace_one(
+        QUERY_CACHE_COLLECTION,
+        {"_id": key},
+        {"_id": key, "value": encoded, "expires_at": datetime.utcnow() + timedelta(seconds=settings.query_cache_ttl)},
+        upsert=True
+    )
+
+async def cached_query(
+    namespace: str,
+    user_id: int,
+    params: Dict[str, Any],
+    compute: Callable[[], Awaitable[Any]],
+    should_cache: Optional[Callable[[Any], bool]] = None
+) -> Any:
+    """Returns the cached result for (namespace, params) in the user's current data generation, computing it on a miss.
+
+    params must include user_id; the generation only advances when that user's data
+    changes, so one tenant's sync leaves every other tenant's entries valid.
+
+    With QUERY_CACHE_BACKEND=mongo entries live in a shared collection, so every
+    uvicorn worker serves the results any of them computed.
+    """
+    if not settings.query_cache_enabled:
+        return await coalesce(query_key(namespace, params, 0), compute)
+
+    key = query_key(namespace, params, await get_data_generation(user_id))
+    shared = settings.query_cache_backend == "mongo"
+
+    found, value = await get_shared(key) if shared else query_cache.get(key)
+    if found:
+        return value
+
+    # Identical requests that miss together share one execution, and only its first
+    # caller stores the result
+    leader = key not in in_flight.tasks
+    value = await coalesce(key, compute)
+    if not leader or (should_cache is not None and not should_cache(value)):
+        return value
+
+    # Encoded to measure the entry, and so the shared backend keeps BSON types intact
+    encoded = json_util.dumps(value)
+    if shared:
+        if len(encoded) <= settings.query_cache_max_entry_bytes:
+            await set_shared(key, encoded)
+    elif len(encoded) <= settings.query_cache_max_entry_bytes:
+        query_cache.set(key, value, len(encoded))
+    return value
+
+async def clear_query_cache() -> int:
+    cleared = len(query_cache.entries)
+    query_cache.clear()
+    if settings.query_cache_backend == "mongo":
+        cleared += await delete_many(QUERY_CACHE_COLLECTION, {})
+    return cleared
+
+def get_query_cache_stats() -> Dict[str, Any]:
+    return {
+        "enabled": settings.query_cache_enabled,
+        "backend": settings.query_cache_backend,
+        **query_cache.get_stats(),
+        "in_flight": len(in_flight.tasks),
+        "executions": in_flight.started,
+        "coalesced": in_flight.coalesced
+    }
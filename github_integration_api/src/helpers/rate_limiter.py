@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import random
+import time
+from typing import Dict, Any, Optional
+from ..config import settings
+
+def token_key(access_token: str) -> str:
+    # Tokens are never used as keys directly so they don't leak through state dumps
+    return hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+def backoff_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter
+    ceiling = min(settings.github_retry_backoff_max, settings.github_retry_backoff_base * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+class RateLimiter:
+    """Request budget and pacing for a single GitHub access token."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.used: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.blocked_until: float = 0.0
+        self.next_request_at: float = 0.0
+        self.throttled_responses = 0
+        self.retries = 0
+        self.lock = asyncio.Lock()
+        # Caps in-flight requests per token, however many syncs share it
+        self.concurrency = asyncio.Semaphore(settings.github_max_concurrency_per_token)
+
+    def update(self, headers) -> None:
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is None or reset is None:
+            return
+
+        remaining = int(remaining)
+        reset_at = float(reset)
+
+        # Responses can come back out of order, so within one window keep the lowest count
+        if self.reset_at == reset_at and self.remaining is not None:
+            self.remaining = min(self.remaining, remaining)
+        else:
+            self.remaining = remaining
+            self.reset_at = reset_at
+
+        if headers.get("x-ratelimit-limit") is not None:
+            self.limit = int(headers["x-ratelimit-limit"])
+        if headers.get("x-ratelimit-used") is not None:
+            self.used = int(headers["x-ratelimit-used"])
+
+    def block_for(self, seconds: float) -> None:
+        self.throttled_responses += 1
+        self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+    def _interval(self, now: float) -> float:
+        if self.remaining is None or self.reset_at is None:
+            return 0.0
+        budget = self.remaining - settings.github_rate_limit_reserve
+        if self.remaining >= settings.github_rate_limit_pace_below or budget <= 0:
+            return 0.0
+        # Spread what is left of the budget evenly over the rest of the window
+        return max(self.reset_at - now, 0.0) / budget
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            now = time.time()
+
+            if self.reset_at is not None and now >= self.reset_at:
+                # Window rolled over; the next response will tell us the new budget
+                self.remaining = None
+                self.reset_at = None
+
+            start = max(now, self.blocked_until, self.next_request_at)
+            if self.remaining is not None and self.remaining <= settings.github_rate_limit_reserve:
+                start = max(start, self.reset_at + 1)
+
+            wait = start - now
+            if wait > settings.github_max_rate_limit_wait:
+                raise RateLimitExceeded(self.key, wait)
+
+            self.next_request_at = start + self._interval(start)
+            if self.remaining is not None:
+                self.remaining -= 1
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def get_state(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "used": self.used,
+            "reset_at": self.reset_at,
+            "reset_in_seconds": max(self.reset_at - now, 0) if self.reset_at else None,
+            "blocked_for_seconds": max(self.blocked_until - now, 0),
+            "pacing_interval_seconds": self._interval(now),
+            "throttled_responses": self.throttled_responses,
+            "retries": self.retries
+        }
+
+class RateLimitExceeded(Exception):
+    def __init__(self, key: str, wait: float):
+        self.key = key
+        self.wait = wait
+        super().__init__(f"Rate limit budget exhausted, next request allowed in {int(wait)}s")
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+
+def get_rate_limiter(access_token: str) -> RateLimiter:
+    key = token_key(access_token)
+    if key not in _rate_limiters:
+        _rate_limiters[key] = RateLimiter(key)
+    return _rate_limiters[key]
@@ -0,0 +1,69 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Any, Optional
+from ..config import settings
+from .database import db, find_one, replace_one, update_one, delete_many
+
+CACHE_COLLECTION = "github_http_cache"
+
+def cache_enabled() -> bool:
+    # Scripts that never connect to MongoDB simply run without the cache
+    return settings.github_cache_enabled and db.database is not None
+
+def cache_key(token_key: str, url: str, params: Optional[Dict[str, Any]]) -> Optional[str]:
+    # A `since` watermark changes on every incremental sync, so those responses would never be reused
+    if params and "since" in params:
+        return None
+    normalized_params = json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.sha256(f"{token_key}|{url}|{normalized_params}".encode()).hexdigest()
+
+def conditional_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+async def get_cached_response(key: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not key or not cache_enabled():
+        return None
+    return await find_one(CACHE_COLLECTION, {"_id": key})
+
+async def touch_response(key: str) -> None:
+    # Entries expire GITHUB_CACHE_TTL seconds after GitHub last confirmed them, so ones still in use stay
+    await update_one(CACHE_COLLECTION, {"_id": key}, {"updated_at": datetime.utcnow()})
+
+async def store_response(key: Optional[str], token_key: str, user_id: Optional[int], url: str, response) -> None:
+    if not key or not cache_enabled():
+        return
+
+    etag = response.headers.get("etag")
+    last_modified = response.headers.get("last-modified")
+    if not etag and not last_modified:
+        return
+    if len(response.content) > settings.github_cache_max_body_bytes:
+        return
+
+    await replace_one(
+        CACHE_COLLECTION,
+        {"_id": key},
+        {
+            "_id": key,
+            "token": token_key,
+            "user_id": user_id,
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            # Stored as text: GitHub payloads may carry keys MongoDB would reject or reinterpret
+            "body": response.text,
+            "link": response.headers.get("link"),
+            "updated_at": datetime.utcnow()
+        },
+        upsert=True
+    )
+
+async def delete_cached_responses(user_id: int, token_key: str) -> int:
+    # Responses fetched before the user id was known (e.g. during the OAuth callback) only carry the token
+    return await delete_many(CACHE_COLLECTION, {"$or": [{"user_id": user_id}, {"token": token_key}]})
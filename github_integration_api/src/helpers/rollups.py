@@ -0,0 +1,350 @@
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, List, Any, Optional
+from bson import ObjectId
+from .database import get_collection, find_one, find_one_and_update, delete_many, replace_one, iter_documents
+
+# Materialized analytics, maintained per repository from the synced collections. A sync
+# refreshes only the repositories it wrote to or deleted from, and only what its changes
+# affect: author weeks from the earliest changed commit's week on, and the pull request
+# and issue counters of the summary by the difference between each changed row's stored
+# and new version. Those changes only live in memory, so a sync marks a repository dirty
+# before its first write and the marker is cleared once the refresh succeeded; a repository
+# still dirty from an earlier sync is recomputed in full. rebuild_rollups() recomputes
+# everything. Weekly buckets start on Monday (UTC) and need MongoDB 5.0+ ($dateTrunc);
+# $merge needs the unique indexes declared in INDEXES.
+
+AUTHOR_WEEKS_COLLECTION = "github_rollup_author_weeks"
+REPOSITORY_ROLLUP_COLLECTION = "github_rollup_repositories"
+ROLLUP_DIRTY_COLLECTION = "github_rollup_dirty"
+ROLLUP_COLLECTIONS = [AUTHOR_WEEKS_COLLECTION, REPOSITORY_ROLLUP_COLLECTION, ROLLUP_DIRTY_COLLECTION]
+
+# Collections whose changes affect a repository's rollups
+ROLLUP_SOURCES = ["github_commits", "github_pulls", "github_issues"]
+
+# Fields a row's rollup contribution depends on, read along with the stored hashes
+ROLLUP_FIELDS = {
+    "github_commits": ["commit.author.date", "commit.committer.date"],
+    "github_pulls": ["state", "created_at", "merged_at"],
+    "github_issues": ["state", "created_at", "closed_at"]
+}
+
+# Summary counters kept for pulls and issues: (field prefix, end timestamp, finished counter, duration)
+SUMMARY_PARTS = {
+    "github_pulls": ("pulls", "merged_at", "merged", "pr_lead_time_hours"),
+    "github_issues": ("issues", "closed_at", "closed", "issue_close_time_hours")
+}
+
+def to_date(field: str) -> Dict[str, Any]:
+    # GitHub timestamps are stored as ISO strings
+    return {"$dateFromString": {"dateString": field, "onError": None, "onNull": None}}
+
+def hours_between(start: str, end: str) -> Dict[str, Any]:
+    return {"$divide": [{"$subtract": [to_date(end), to_date(start)]}, 3600000]}
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    # Naive UTC, like the datetimes read back from MongoDB
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def week_of(moment: datetime) -> datetime:
+    return datetime.combine(moment.date() - timedelta(days=moment.weekday()), time.min)
+
+def commit_date(document: Dict[str, Any]) -> Optional[datetime]:
+    details = document.get("commit") or {}
+    return parse_date((details.get("author") or {}).get("date") or (details.get("committer") or {}).get("date"))
+
+def contribution(collection: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    _, end_field, _, _ = SUMMARY_PARTS[collection]
+    start, end = parse_date(document.get("created_at")), parse_date(document.get(end_field))
+    hours = (end - start).total_seconds() / 3600 if start and end else None
+    return {"open": int(document.get("state") == "open"), "hours": hours}
+
+class RollupChanges:
+    """What one sync changed in each repository's rollup sources, recorded as rows are written or deleted.
+
+    Commits move the earliest week whose author rollups are recomputed. Pulls and issues
+    add the difference between a row's new and stored contribution to the summary counters;
+    a row that gives up a duration at least as long as the stored maximum makes the refresh
+    aggregate that part again, since a maximum can't be decremented.
+    """
+
+    def __init__(self):
+        self.repositories: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, collection: str, repository: str, stored: Optional[Dict[str, Any]], document: Optional[Dict[str, Any]]):
+        changes = self.repositories.setdefault(repository, {
+            "commits_since": None,
+            **{part: {"total": 0, "open": 0, "finished": 0, "hours": 0.0, "max": None, "removed_max": None} for part in SUMMARY_PARTS}
+        })
+
+        if collection == "github_commits":
+            weeks = [week_of(date) for date in (commit_date(stored or {}), commit_date(document or {})) if date]
+            if changes["commits_since"]:
+                weeks.append(changes["commits_since"])
+            changes["commits_since"] = min(weeks, default=None)
+            return
+
+        delta = changes[collection]
+        old = contribution(collection, stored) if stored else None
+        new = contribution(collection, document) if document else None
+        for value, sign in ((old, -1), (new, 1)):
+            if value:
+                delta["total"] += sign
+                delta["open"] += sign * value["open"]
+                if value["hours"] is not None:
+                    delta["finished"] += sign
+                    delta["hours"] += sign * value["hours"]
+        if new and new["hours"] is not None:
+            delta["max"] = max(delta["max"] or 0.0, new["hours"])
+        if old and old["hours"] is not None and (not new or new["hours"] != old["hours"]):
+            delta["removed_max"] = max(delta["removed_max"] or 0.0, old["hours"])
+
+async def aggregate_one(collection_name: str, pipeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    collection = await get_collection(collection_name)
+    async for document in collection.aggregate(pipeline):
+        return document
+    return {}
+
+async def mark_dirty(user_id: int, repository: str, generation: int):
+    # Keeps the generation of the oldest sync whose changes weren't refreshed yet
+    await find_one_and_update(
+        ROLLUP_DIRTY_COLLECTION,
+        {"integration_user_id": user_id, "repository": repository},
+        {"$setOnInsert": {"since_generation": generation, "marked_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+async def dirty_repositories(user_id: int) -> Dict[str, int]:
+    return {
+        document["repository"]: document["since_generation"]
+        async for document in iter_documents(ROLLUP_DIRTY_COLLECTION, {"integration_user_id": user_id})
+    }
+
+async def refresh_author_weeks(user_id: int, repository: str, run_id: str, since: Optional[datetime] = None):
+    """Recomputes a repository's weekly author rollups, or only the weeks starting at `since` or later."""
+    scope = {"integration_user_id": user_id, "repository": repository}
+    match, weeks, dated = scope, scope, {"$ne": None}
+    if since:
+        # GitHub timestamps are UTC ("...Z"), so they compare as strings on the date index
+        timestamp = since.strftime("%Y-%m-%dT%H:%M:%SZ")
+        match = {**scope, "$or": [
+            {"commit.author.date": {"$gte": timestamp}},
+            {"commit.author.date": None, "commit.committer.date": {"$gte": timestamp}}
+        ]}
+        weeks = {**scope, "week": {"$gte": since}}
+        dated = {"$gte": since}
+
+    commits = await get_collection("github_commits")
+    pipeline = [
+        {"$match": match},
+        {"$project": {
+            "author": {"$ifNull": ["$author.login", "$commit.author.email", "$commit.author.name", "unknown"]},
+            "date": to_date({"$ifNull": ["$commit.author.date", "$commit.committer.date"]})
+        }},
+        {"$match": {"date": dated}},
+        {"$group": {
+            "_id": {"author": "$author", "week": {"$dateTrunc": {"date": "$date", "unit": "week", "startOfWeek": "monday"}}},
+            "commits": {"$sum": 1},
+            "first_commit_at": {"$min": "$date"},
+            "last_commit_at": {"$max": "$date"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "integration_user_id": user_id,
+            "repository": repository,
+            "author": "$_id.author",
+            "week": "$_id.week",
+            "commits": 1,
+            "first_commit_at": 1,
+            "last_commit_at": 1,
+            "run_id": run_id
+        }},
+        {"$merge": {
+            "into": AUTHOR_WEEKS_COLLECTION,
+            "on": ["integration_user_id", "repository", "author", "week"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+    async for _ in commits.aggregate(pipeline):
+        pass
+
+    # Weeks that no longer have commits (e.g. after a force push) weren't rewritten by this run
+    await delete_many(AUTHOR_WEEKS_COLLECTION, {**weeks, "run_id": {"$ne": run_id}})
+
+async def commit_summary(scope: Dict[str, Any]) -> Dict[str, Any]:
+    # Read from the author weeks, which are far fewer rows than the commits
+    commits = await aggregate_one(AUTHOR_WEEKS_COLLECTION, [
+        {"$match": scope},
+        {"$group": {
+            "_id": None,
+            "commits": {"$sum": "$commits"},
+            "authors": {"$addToSet": "$author"},
+            "first_commit_at": {"$min": "$first_commit_at"},
+            "last_commit_at": {"$max": "$last_commit_at"}
+        }},
+        {"$project": {"commits": 1, "authors": {"$size": "$authors"}, "first_commit_at": 1, "last_commit_at": 1}}
+    ])
+    return {
+        "commits": commits.get("commits", 0),
+        "authors": commits.get("authors", 0),
+        "first_commit_at": commits.get("first_commit_at"),
+        "last_commit_at": commits.get("last_commit_at")
+    }
+
+async def aggregate_part(collection: str, scope: Dict[str, Any]) -> Dict[str, Any]:
+    _, end_field, _, _ = SUMMARY_PARTS[collection]
+    part = await aggregate_one(collection, [
+        {"$match": scope},
+        {"$project": {
+            "state": 1,
+            "hours": {"$cond": [{"$ifNull": [f"${end_field}", False]}, hours_between("$created_at", f"${end_field}"), None]}
+        }},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "open": {"$sum": {"$cond": [{"$eq": ["$state", "open"]}, 1, 0]}},
+            "finished": {"$sum": {"$cond": [{"$ne": ["$hours", None]}, 1, 0]}},
+            "hours": {"$sum": "$hours"},
+            "max": {"$max": "$hours"}
+        }}
+    ])
+    return {
+        "total": part.get("total", 0),
+        "open": part.get("open", 0),
+        "finished": part.get("finished", 0),
+        "hours": part.get("hours", 0.0),
+        "max": part.get("max")
+    }
+
+def stored_part(collection: str, summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    prefix, _, finished, duration = SUMMARY_PARTS[collection]
+    if f"{duration}_sum" not in summary:
+        # Written before summaries were maintained incrementally
+        return None
+    return {
+        "total": summary[f"{prefix}_total"],
+        "open": summary[f"{prefix}_open"],
+        "finished": summary[f"{prefix}_{finished}"],
+        "hours": summary[f"{duration}_sum"],
+        "max": summary[f"max_{duration}"]
+    }
+
+def apply_delta(part: Dict[str, Any], delta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if delta["removed_max"] is not None and (part["max"] is None or delta["removed_max"] >= part["max"]):
+        return None
+    finished = part["finished"] + delta["finished"]
+    maxima = [value for value in (part["max"], delta["max"]) if value is not None]
+    return {
+        "total": part["total"] + delta["total"],
+        "open": part["open"] + delta["open"],
+        "finished": finished,
+        "hours": part["hours"] + delta["hours"] if finished else 0.0,
+        "max": max(maxima) if maxima else None
+    }
+
+def part_fields(collection: str, part: Dict[str, Any]) -> Dict[str, Any]:
+    prefix, _, finished, duration = SUMMARY_PARTS[collection]
+    return {
+        f"{prefix}_total": part["total"],
+        f"{prefix}_open": part["open"],
+        f"{prefix}_{finished}": part["finished"],
+        f"avg_{duration}": part["hours"] / part["finished"] if part["finished"] else None,
+        f"max_{duration}": part["max"],
+        f"{duration}_sum": part["hours"]
+    }
+
+async def refresh_repository(user_id: int, repository: str, run_id: str, changes: Optional[Dict[str, Any]] = None):
+    """Refreshes one repository's rollups from a sync's changes, or recomputes them without any."""
+    scope = {"integration_user_id": user_id, "repository": repository}
+    summary = await find_one(REPOSITORY_ROLLUP_COLLECTION, scope) if changes else None
+
+    if summary is None:
+        # First refresh of the repository, a rebuild, or changes an earlier sync didn't refresh
+        await refresh_author_weeks(user_id, repository, run_id)
+        commits = await commit_summary(scope)
+        parts = {collection: await aggregate_part(collection, scope) for collection in SUMMARY_PARTS}
+    else:
+        if changes["commits_since"]:
+            await refresh_author_weeks(user_id, repository, run_id, changes["commits_since"])
+            commits = await commit_summary(scope)
+        else:
+            commits = {field: summary.get(field) for field in ("commits", "authors", "first_commit_at", "last_commit_at")}
+        parts = {}
+        for collection in SUMMARY_PARTS:
+            stored = stored_part(collection, summary)
+            part = apply_delta(stored, changes[collection]) if stored else None
+            parts[collection] = part or await aggregate_part(collection, scope)
+
+    document = {**scope, **commits}
+    for collection, part in parts.items():
+        document.update(part_fields(collection, part))
+    document["updated_at"] = datetime.utcnow()
+    await replace_one(REPOSITORY_ROLLUP_COLLECTION, scope, document, upsert=True)
+
+async def refresh_rollups(
+    user_id: int,
+    repositories: List[str],
+    changes: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Refreshes the given repositories' rollups, from their changes where given; failures are reported, not raised."""
+    run_id = str(ObjectId())
+    refreshed = []
+    errors = {}
+
+    for repository in repositories:
+        try:
+            await refresh_repository(user_id, repository, run_id, (changes or {}).get(repository))
+            await delete_many(ROLLUP_DIRTY_COLLECTION, {"integration_user_id": user_id, "repository": repository})
+            refreshed.append(repository)
+        except Exception as e:
+            # e.g. MongoDB older than 5.0, or the $merge unique index not built yet. The
+            # repository stays dirty, so the next sync recomputes it in full.
+            errors[repository] = str(e)
+            print(f" Failed to refresh rollups for {repository}: {e}")
+
+    return {"refreshed": len(refreshed), "errors": errors}
+
+async def delete_rollups(filter_dict: Dict[str, Any]) -> int:
+    deleted = 0
+    for collection in ROLLUP_COLLECTIONS:
+        deleted += await delete_many(collection, filter_dict)
+    return deleted
+
+async def rebuild_rollups(user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Recomputes every repository's rollups, for backfills or after changing a rollup definition."""
+    user_filter = {"integration_user_id": user_id} if user_id is not None else {}
+    results = {"users": 0, "refreshed": 0, "errors": {}}
+
+    repositories_by_user: Dict[int, set] = {}
+    for collection_name in ROLLUP_SOURCES:
+        collection = await get_collection(collection_name)
+        pipeline = [
+            {"$match": user_filter},
+            {"$group": {"_id": {"user": "$integration_user_id", "repository": "$repository"}}}
+        ]
+        async for group in collection.aggregate(pipeline):
+            repositories_by_user.setdefault(group["_id"]["user"], set()).add(group["_id"]["repository"])
+
+    # Rollups of repositories that no longer have any data
+    for rollup_user, known in list(repositories_by_user.items()):
+        await delete_rollups({"integration_user_id": rollup_user, "repository": {"$nin": sorted(known)}})
+    if user_id is None:
+        await delete_rollups({"integration_user_id": {"$nin": list(repositories_by_user)}})
+    elif user_id not in repositories_by_user:
+        await delete_rollups(user_filter)
+
+    for rollup_user, repositories in repositories_by_user.items():
+        refreshed = await refresh_rollups(rollup_user, sorted(repositories))
+        results["users"] += 1
+        results["refreshed"] += refreshed["refreshed"]
+        results["errors"].update(refreshed["errors"])
+
+    return results
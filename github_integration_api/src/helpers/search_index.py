@@ -0,0 +1,433 @@
+import asyncio
+import heapq
+import math
+import re
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+from bson import ObjectId
+from ..config import settings
+from .database import (
+    upsert_many, update_many, iter_documents, get_collection, get_read_collection, bump_all_data_generations,
+    estimated_count
+)
+from .pagination import get_field
+
+# Trigram index for substring and typo-tolerant search over the short text fields
+# of synced documents. MongoDB holds one entry per document (the normalized text
+# plus the fields deletes are scoped by); every API process loads the entries into
+# sorted posting lists of document ordinals and keeps them current by re-reading
+# the entries written or tombstoned since its last refresh (by their updated_at).
+
+SEARCH_INDEX_COLLECTION = "github_search_index"
+
+SEARCH_INDEX_FIELDS = {
+    "github_organizations": ["login", "description"],
+    "github_users": ["login"],
+    "github_repos": ["name", "full_name", "description"],
+    "github_commits": ["commit.message", "author.login"],
+    "github_pulls": ["title", "user.login"],
+    "github_issues": ["title", "user.login"],
+    "github_changelogs": ["event", "actor.login"]
+}
+
+# Copied into entries so deletes of a user, repository or organization can be mirrored
+SCOPE_FIELDS = ["integration_user_id", "repository", "organization"]
+
+COLLECTIONS = list(SEARCH_INDEX_FIELDS)
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def document_text(collection: str, document: Dict[str, Any]) -> str:
+    values = [get_field(document, field) for field in SEARCH_INDEX_FIELDS[collection]]
+    # Fields are joined by newlines, which never occur in a normalized query,
+    # so no trigram spans two fields
+    text = "\n".join(normalize(value) for value in values if isinstance(value, str) and value.strip())
+    return text[:settings.search_index_max_text_length]
+
+def trigrams(text: str, padded: bool = True) -> set:
+    # Padding adds grams for the start and end of each field (" fa", "pi "), which keeps
+    # typos at word edges matchable; substring queries are not padded since the
+    # keyword may sit in the middle of a word
+    if padded:
+        text = " " + text.replace("\n", " \n ") + " "
+    return {text[i:i + 3] for i in range(len(text) - 2) if "\n" not in text[i:i + 3]}
+
+def entry_id(collection: str, document_id: Any) -> str:
+    return f"{collection}:{document_id}"
+
+class SearchIndex:
+    """In-memory posting lists; a document is an integer ordinal into parallel arrays.
+
+    Postings are partitioned by user through the ordinals: compaction (and the initial load,
+    which reads entries sorted by user) numbers each user's documents contiguously, so a
+    user's part of any posting list is found with two binary searches. Documents added
+    since then sit past base_end and are filtered by user until the next compaction.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, array] = {}
+        self.doc_ids = bytearray()                # 12-byte ObjectIds, one per ordinal
+        self.doc_collections = array("B")
+        self.doc_users = array("q")
+        self.doc_lengths = array("H")
+        self.doc_hashes = array("I")
+        self.doc_texts = bytearray()              # normalized UTF-8 texts, back to back
+        self.text_offsets = array("Q", [0])      # ordinal's text is doc_texts[offsets[o]:offsets[o + 1]]
+        self.alive = bytearray()
+        self.ordinals: Dict[bytes, int] = {}
+        self.user_ranges: Dict[int, Tuple[int, int]] = {}
+        self.base_end = 0
+        self.dead = 0
+        self.ready = False
+        self.loaded_through: Optional[datetime] = None
+        self.refreshed_at = 0.0
+        self.refresh_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def add(self, collection: str, document_id: ObjectId, user_id: int, text: str) -> None:
+        key = document_id.binary
+        text_hash = zlib.crc32(text.encode())
+        current = self.ordinals.get(key)
+        if current is not None:
+            if self.doc_hashes[current] == text_hash:
+                return
+            self.remove(document_id)
+
+        # Ordinals only ever grow, so appending keeps every posting list sorted
+        ordinal = len(self.alive)
+        self.doc_ids += key
+        self.doc_collections.append(COLLECTIONS.index(collection))
+        self.doc_users.append(user_id or 0)
+        self.doc_lengths.append(min(len(text), 65535))
+        self.doc_hashes.append(text_hash)
+        self.doc_texts += text.encode()
+        self.text_offsets.append(len(self.doc_texts))
+        self.alive.append(1)
+        self.ordinals[key] = ordinal
+        for gram in trigrams(text):
+            postings = self.postings.get(gram)
+            if postings is None:
+                postings = self.postings[gram] = array("I")
+            postings.append(ordinal)
+
+    def remove(self, document_id: ObjectId) -> None:
+        ordinal = self.ordinals.pop(document_id.binary, None)
+        if ordinal is not None:
+            self.alive[ordinal] = 0
+            self.dead += 1
+
+    def partition(self) -> None:
+        """Records each user's ordinal range; the ordinals must be grouped by user."""
+        self.user_ranges = {}
+        start = 0
+        for ordinal in range(1, len(self.doc_users) + 1):
+            if ordinal == len(self.doc_users) or self.doc_users[ordinal] != self.doc_users[start]:
+                self.user_ranges[self.doc_users[start]] = (start, ordinal)
+                start = ordinal
+        self.base_end = len(self.doc_users)
+
+    def compact(self) -> None:
+        """Drops removed ordinals from every posting list and renumbers the rest grouped by user."""
+        # sorted() is stable, so each user's documents keep their relative order
+        keep = sorted((ordinal for ordinal, alive in enumerate(self.alive) if alive), key=self.doc_users.__getitem__)
+        remap = array("i", [-1]) * len(self.alive)
+        for new_ordinal, ordinal in enumerate(keep):
+            remap[ordinal] = new_ordinal
+
+        self.doc_ids = bytearray(b"".join(bytes(self.doc_ids[o * 12:o * 12 + 12]) for o in keep))
+        self.doc_collections = array("B", (self.doc_collections[o] for o in keep))
+        self.doc_users = array("q", (self.doc_users[o] for o in keep))
+        self.doc_lengths = array("H", (self.doc_lengths[o] for o in keep))
+        self.doc_hashes = array("I", (self.doc_hashes[o] for o in keep))
+        texts = [self.text(o) for o in keep]
+        self.doc_texts = bytearray(b"".join(texts))
+        self.text_offsets = array("Q", [0])
+        for text in texts:
+            self.text_offsets.append(self.text_offsets[-1] + len(text))
+        self.alive = bytearray([1]) * len(keep)
+        self.ordinals = {bytes(self.doc_ids[o * 12:o * 12 + 12]): o for o in range(len(keep))}
+
+        for gram in list(self.postings):
+            postings = array("I", sorted(remap[o] for o in self.postings[gram] if remap[o] >= 0))
+            if postings:
+                self.postings[gram] = postings
+            else:
+                del self.postings[gram]
+        self.dead = 0
+        self.partition()
+
+    def maybe_compact(self) -> None:
+        added = len(self.alive) - self.base_end
+        if (self.dead > 10000 and self.dead > len(self.alive) * 0.3) or (added > 10000 and added > self.base_end * 0.25):
+            self.compact()
+
+    def user_postings(self, postings: array, user_id: int) -> array:
+        """The part of a posting list that belongs to one user."""
+        start, end = self.user_ranges.get(user_id, (0, 0))
+        owned = postings[bisect_left(postings, start):bisect_left(postings, end)]
+        added = bisect_left(postings, self.base_end)
+        if added < len(postings):
+            owned.extend(ordinal for ordinal in postings[added:] if self.doc_users[ordinal] == user_id)
+        return owned
+
+    def text(self, ordinal: int) -> bytes:
+        return bytes(self.doc_texts[self.text_offsets[ordinal]:self.text_offsets[ordinal + 1]])
+
+    def document_id(self, ordinal: int) -> ObjectId:
+        return ObjectId(bytes(self.doc_ids[ordinal * 12:ordinal * 12 + 12]))
+
+    def match(
+        self,
+        query: str,
+        collections: List[str],
+        user_id: int,
+        fuzzy: bool = False,
+        limit: int = 50
+    ) -> Optional[List[Tuple[str, ObjectId, float]]]:
+        """Returns (collection, _id, score) for the best matches, or None if the query can't use the index.
+
+        Every query trigram has to be present for a substring match, and the candidates are then
+        checked against the indexed text, since the trigrams can also occur apart (e.g. "readmean"
+        in "readme and the mean"). A fuzzy match only needs
+        SEARCH_INDEX_FUZZY_THRESHOLD of them; by pigeonhole any such document appears in one of
+        the rarest (n - required + 1) posting lists, so only those are scanned for candidates
+        and the rest are probed with binary search.
+        """
+        needle = normalize(query)
+        grams = trigrams(needle, padded=fuzzy)
+        needle = needle.encode()
+        if not self.ready or not grams:
+            return None
+
+        empty = array("I")
+        lists = sorted((self.user_postings(self.postings.get(gram, empty), user_id) for gram in grams), key=len)
+        required = len(lists) if not fuzzy else max(1, math.ceil(len(lists) * settings.search_index_fuzzy_threshold))
+        seeds = lists[:len(lists) - required + 1]
+        probes = lists[len(lists) - required + 1:]
+
+        allowed = {COLLECTIONS.index(collection) for collection in collections}
+        counts: Dict[int, int] = {}
+        for postings in seeds:
+            for ordinal in postings:
+                counts[ordinal] = counts.get(ordinal, 0) + 1
+
+        def scored():
+            for ordinal, matched in counts.items():
+                if not self.alive[ordinal] or self.doc_collections[ordinal] not in allowed:
+                    continue
+                for position, postings in enumerate(probes):
+                    if matched + len(probes) - position < required:
+                        break
+                    index = bisect_left(postings, ordinal)
+                    if index < len(postings) and postings[index] == ordinal:
+                        matched += 1
+                if matched >= required and (fuzzy or needle in self.text(ordinal)):
+                    # More matching trigrams first, then shorter texts (a closer match)
+                    yield (-matched, self.doc_lengths[ordinal], ordinal)
+
+        best = heapq.nsmallest(limit, scored())
+        return [
+            (COLLECTIONS[self.doc_collections[ordinal]], self.document_id(ordinal), round(-negative / len(lists), 3))
+            for negative, _, ordinal in best
+        ]
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "documents": len(self.ordinals),
+            "removed_slots": self.dead,
+            "trigrams": len(self.postings),
+            "postings": sum(len(postings) for postings in self.postings.values()),
+            "users": len(self.user_ranges),
+            "unpartitioned_documents": len(self.alive) - self.base_end,
+            "loaded_through": self.loaded_through
+        }
+
+search_index = SearchIndex()
+
+def build_entry(collection: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    entry = {
+        "_id": entry_id(collection, document["_id"]),
+        "collection": collection,
+        "document_id": document["_id"],
+        "text": document_text(collection, document),
+        "deleted": False,
+        "updated_at": datetime.utcnow()
+    }
+    for field in SCOPE_FIELDS:
+        if document.get(field) is not None:
+            entry[field] = document[field]
+    return entry
+
+async def index_documents(collection: str, documents: List[Dict[str, Any]]) -> None:
+    """Writes index entries for documents that carry their MongoDB _id."""
+    entries = [build_entry(collection, document) for document in documents]
+    await upsert_many(SEARCH_INDEX_COLLECTION, entries, ["_id"], sync=True)
+
+async def remove_from_index(filter_dict: Dict[str, Any]) -> int:
+    # Entries are tombstoned rather than deleted so other processes see the removal on refresh
+    return await update_many(
+        SEARCH_INDEX_COLLECTION,
+        {**filter_dict, "deleted": False},
+        {"$set": {"deleted": True, "updated_at": datetime.utcnow()}, "$unset": {"text": ""}}
+    )
+
+def apply_entry(entry: Dict[str, Any]) -> None:
+    document_id = entry["document_id"]
+    if entry.get("deleted"):
+        search_index.remove(document_id)
+    else:
+        search_index.add(entry["collection"], document_id, entry.get("integration_user_id"), entry.get("text") or "")
+
+async def read_entries(filter_dict: Dict[str, Any], sort: Optional[List[Any]] = None):
+    collection = await get_collection(SEARCH_INDEX_COLLECTION)
+    projection = {"collection": 1, "document_id": 1, "integration_user_id": 1, "text": 1, "deleted": 1}
+    async for entry in collection.find(filter_dict, projection, sort=sort, batch_size=5000):
+        yield entry
+
+async def load_search_index() -> None:
+    """Loads every live entry into memory; queries fall back to MongoDB until this finishes."""
+    started = time.monotonic()
+    loaded_through = datetime.utcnow()
+
+    loaded = 0
+    # Read grouped by user, so the loaded ordinals are partitioned without a compaction
+    async for entry in read_entries({"deleted": False}, sort=[("integration_user_id", 1)]):
+        apply_entry(entry)
+        loaded += 1
+        if loaded % 50000 == 0:
+            # Let requests run while a large index loads
+            await asyncio.sleep(0)
+
+    search_index.partition()
+    search_index.loaded_through = loaded_through
+    search_index.refreshed_at = time.monotonic()
+    search_index.ready = True
+    print(f" Loaded search index: {loaded} documents in {time.monotonic() - started:.1f}s")
+
+    if not loaded and any([await estimated_count(collection) for collection in COLLECTIONS]):
+        print(" Search index is empty, building it from the synced collections")
+        await rebuild_search_index()
+
+async def refresh_search_index() -> None:
+    """Applies entries written since the last refresh, at most once per refresh interval."""
+    if not search_index.ready or search_index.refresh_lock.locked():
+        return
+    if time.monotonic() - search_index.refreshed_at < settings.search_index_refresh_interval:
+        return
+
+    async with search_index.refresh_lock:
+        search_index.refreshed_at = time.monotonic()
+        loaded_through = datetime.utcnow()
+
+        # Entries are stamped by the writing process before the write is sent, so one
+        # can land after a refresh that started later than its updated_at. Re-reading
+        # SEARCH_INDEX_REFRESH_OVERLAP seconds covers that and clock skew between
+        # processes; entries applied twice are skipped by their text hash
+        since = search_index.loaded_through - timedelta(seconds=settings.search_index_refresh_overlap)
+        async for entry in read_entries({"updated_at": {"$gte": since}}):
+            apply_entry(entry)
+        search_index.loaded_through = loaded_through
+        search_index.maybe_compact()
+
+async def rebuild_search_index() -> Dict[str, int]:
+    """Re-creates every entry from the synced collections, e.g. for data synced before the index existed."""
+    started = datetime.utcnow()
+    counts = {}
+
+    for collection in COLLECTIONS:
+        projection = {field: 1 for field in SEARCH_INDEX_FIELDS[collection] + SCOPE_FIELDS}
+        batch = []
+        counts[collection] = 0
+        async for document in iter_documents(collection, {}, projection):
+            document["_id"] = ObjectId(document["_id"])
+            batch.append(document)
+            if len(batch) >= 1000:
+                await index_documents(collection, batch)
+                counts[collection] += len(batch)
+                batch = []
+        if batch:
+            await index_documents(collection, batch)
+            counts[collection] += len(batch)
+
+    # Anything not rewritten above belongs to a document that no longer exists
+    counts["removed"] = await remove_from_index({"updated_at": {"$lt": started}})
+    async for entry in read_entries({"updated_at": {"$gte": started}}):
+        apply_entry(entry)
+    search_index.maybe_compact()
+
+    # Any user's search results may have changed
+    await bump_all_data_generations()
+    return counts
+
+async def search_documents(
+    keyword: str,
+    collections: List[str],
+    user_id: int,
+    fuzzy: bool = False,
+    projections: Optional[Dict[str, Dict[str, Any]]] = None,
+    limit: int = 50
+) -> Optional[Dict[str, Any]]:
+    """Ranked index search across collections, shaped like search_across_collections.
+
+    Returns None when the index cannot answer (not loaded yet or keyword shorter than a trigram).
+    """
+    await refresh_search_index()
+    matches = search_index.match(keyword, collections, user_id=user_id, fuzzy=fuzzy, limit=limit * len(collections))
+    if matches is None:
+        return None
+
+    scores = {}
+    for collection, document_id, score in matches:
+        scores.setdefault(collection, {})
+        if len(scores[collection]) < limit:
+            scores[collection][document_id] = score
+
+    async def fetch(collection: str) -> List[Dict[str, Any]]:
+        ids = scores.get(collection)
+        if not ids:
+            return []
+        projection = dict((projections or {}).get(collection) or {}) or None
+        source = await get_read_collection(collection)
+        documents = {document["_id"]: document async for document in source.find({"_id": {"$in": list(ids)}}, projection)}
+        ranked = []
+        for document_id, score in ids.items():
+            document = documents.get(document_id)
+            if document:
+                document["_id"] = str(document_id)
+                document["score"] = score
+                ranked.append(document)
+        return ranked
+
+    fetched = await asyncio.gather(*(fetch(collection) for collection in collections))
+    return {"results": dict(zip(collections, fetched)), "errors": {}, "timed_out": []}
+
+def substring_filter(collection: str, keyword: str) -> Dict[str, Any]:
+    """The MongoDB equivalent of a substring match: the keyword in any indexed field, ignoring case and spacing."""
+    pattern = r"\s+".join(re.escape(word) for word in normalize(keyword).split(" "))
+    return {"$or": [{field: {"$regex": pattern, "$options": "i"}} for field in SEARCH_INDEX_FIELDS[collection]]}
+
+async def match_document_ids(
+    keyword: str,
+    collection: str,
+    user_id: int,
+    fuzzy: bool = False
+) -> Optional[Tuple[List[ObjectId], bool]]:
+    """_ids of one user's documents in a collection that match keyword, for use in a MongoDB filter.
+
+    At most SEARCH_INDEX_MAX_CANDIDATES of the best-ranked matches are returned; the flag
+    says whether more documents matched and were left out.
+    """
+    await refresh_search_index()
+    limit = settings.search_index_max_candidates
+    matches = search_index.match(keyword, [collection], user_id=user_id, fuzzy=fuzzy, limit=limit + 1)
+    if matches is None:
+        return None
+    return [document_id for _, document_id, _ in matches[:limit]], len(matches) > limit
@@ -0,0 +1,495 @@
+import asyncio
+import hashlib
+import json
+import time
+from contextlib import aclosing
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from bson import ObjectId
+from ..config import settings
+from .database import (
+    sync_write, mark_seen, delete_unseen, delete_many, iter_documents, find_one, find_one_and_update, replace_one,
+    bump_data_generation
+)
+from .github_api import GitHubAPI, GitHubAPIError
+from .search_index import index_documents, remove_from_index
+from .rollups import (
+    ROLLUP_SOURCES, ROLLUP_FIELDS, RollupChanges, refresh_rollups, delete_rollups, mark_dirty, dirty_repositories
+)
+
+SYNC_COLLECTIONS = [
+    "github_organizations",
+    "github_repos",
+    "github_commits",
+    "github_pulls",
+    "github_issues",
+    "github_changelogs",
+    "github_users"
+]
+
+SYNC_STATE_COLLECTION = "github_sync_state"
+
+# GitHub errors that would fail every repository alike (revoked token, exhausted rate
+# limit) fail the sync; others only skip the repository resource they happened in
+FATAL_STATUSES = (401, 429)
+
+# Fields that identify a document within one integration (integration_user_id is always added)
+DOCUMENT_KEYS = {
+    "github_organizations": ["id"],
+    "github_users": ["organization", "id"],
+    "github_repos": ["id"],
+    "github_commits": ["repository", "sha"],
+    "github_pulls": ["repository", "id"],
+    "github_issues": ["repository", "id"],
+    "github_changelogs": ["repository", "id"]
+}
+
+SYNC_MODES = ["full", "incremental"]
+
+# Collections whose documents belong to a repository (the rest are scoped by user or organization)
+REPOSITORY_COLLECTIONS = ["github_commits", "github_pulls", "github_issues", "github_changelogs"]
+
+# Written by the sync itself, so they never count as a change to the GitHub payload
+BOOKKEEPING_FIELDS = {"_id", "sync_generation", "content_hash"}
+
+def content_hash(document: Dict[str, Any]) -> str:
+    payload = {key: value for key, value in document.items() if key not in BOOKKEEPING_FIELDS}
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+async def next_sync_generation(user_id: int) -> int:
+    integration = await find_one_and_update(
+        "github_integration",
+        {"user_id": user_id},
+        {"$inc": {"sync_generation": 1}}
+    )
+    return integration["sync_generation"]
+
+class SyncSlots:
+    semaphore: asyncio.Semaphore = None
+
+sync_slots = SyncSlots()
+
+def get_sync_semaphore() -> asyncio.Semaphore:
+    # Shared by every sync running in this process
+    if sync_slots.semaphore is None:
+        sync_slots.semaphore = asyncio.Semaphore(settings.sync_max_concurrency)
+    return sync_slots.semaphore
+
+def commit_date(commit: Dict[str, Any]) -> Optional[str]:
+    details = commit.get("commit") or {}
+    return (details.get("committer") or {}).get("date") or (details.get("author") or {}).get("date")
+
+def latest(current: Optional[Any], values: List[Any]) -> Optional[Any]:
+    candidates = [value for value in [current, *values] if value]
+    return max(candidates) if candidates else None
+
+class ScopeWriter:
+    """Writes the documents of one scope (e.g. one repository's commits), skipping unchanged ones.
+
+    The stored hashes of each page, and the fields the rollups are computed from, are looked
+    up with a projection-only $in query; changed and deleted rows are recorded so the rollups
+    can be refreshed from just those differences. In a full
+    sync the unchanged documents of a page are restamped with the sync generation in a single
+    update, so whatever still carries an older generation when the scope finishes was not seen
+    and is deleted. A page that can't be fetched raises, so the sweep only runs once every page
+    of the scope was received and a scope that failed partway keeps its documents. Incremental
+    syncs only see part of a scope and never delete.
+    """
+
+    def __init__(self, engine: "SyncEngine", collection: str, scope: Dict[str, Any]):
+        self.engine = engine
+        self.collection = collection
+        self.scope = scope
+        self.id_field = DOCUMENT_KEYS[collection][-1]
+
+    async def __aenter__(self) -> "ScopeWriter":
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        if exc_type is not None or self.engine.incremental:
+            return
+        unseen = {**self.scope, "sync_generation": {"$ne": self.engine.generation}}
+        documents = []
+        async for document in iter_documents(self.collection, unseen, {"_id": 1, **self.rollup_projection}):
+            documents.append(document)
+            if len(documents) == 1000:
+                await self.delete(documents)
+                documents = []
+        await self.delete(documents)
+
+    @property
+    def rollup_projection(self) -> Dict[str, int]:
+        return {field: 1 for field in ROLLUP_FIELDS.get(self.collection, [])}
+
+    async def delete(self, documents: List[Dict[str, Any]]):
+        if not documents:
+            return
+        document_ids = [ObjectId(document["_id"]) for document in documents]
+        await self.mark_rollups_dirty()
+        await remove_from_index({"document_id": {"$in": document_ids}})
+        deleted = await delete_many(self.collection, {**self.scope, "_id": {"$in": document_ids}})
+        self.engine.record_writes("deleted", deleted)
+        self.record_rollup_changes([(document, None) for document in documents])
+
+    async def mark_rollups_dirty(self):
+        if self.collection in ROLLUP_SOURCES:
+            await self.engine.mark_rollups_dirty(self.scope["repository"])
+
+    def record_rollup_changes(self, changes: List[Any]):
+        # (stored, new) pairs; either side is None for inserted or deleted rows
+        if self.collection in ROLLUP_SOURCES:
+            for stored, document in changes:
+                self.engine.rollup_changes.record(self.collection, self.scope["repository"], stored, document)
+
+    async def stored_documents(self, keys: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        # Hashes, plus what the rows contributed to the rollups before this write
+        projection = {self.id_field: 1, "content_hash": 1, "_id": 0, **self.rollup_projection}
+        return {
+            document.get(self.id_field): document
+            async for document in iter_documents(self.collection, {**self.scope, self.id_field: {"$in": keys}}, projection)
+        }
+
+    async def index(self, documents: List[Dict[str, Any]]):
+        # Search index entries reference the stored _id, which upserts don't return
+        keys = [document.get(self.id_field) for document in documents]
+        projection = {self.id_field: 1}
+        stored_ids = {
+            document.get(self.id_field): ObjectId(document["_id"])
+            async for document in iter_documents(self.collection, {**self.scope, self.id_field: {"$in": keys}}, projection)
+        }
+        await index_documents(
+            self.collection,
+            [{**document, "_id": stored_ids[key]} for document, key in zip(documents, keys) if key in stored_ids]
+        )
+
+    async def write(self, documents: List[Dict[str, Any]]) -> int:
+        if not documents:
+            return 0
+
+        for document in documents:
+            document["content_hash"] = content_hash(document)
+        keys = [document.get(self.id_field) for document in documents]
+        stored = await self.stored_documents(keys)
+        hashes = {key: document.get("content_hash") for key, document in stored.items()}
+
+        changed = [document for document, key in zip(documents, keys) if hashes.get(key) != document["content_hash"]]
+        unchanged = [key for document, key in zip(documents, keys) if hashes.get(key) == document["content_hash"]]
+        if unchanged and not self.engine.incremental:
+            await mark_seen(self.collection, {**self.scope, self.id_field: {"$in": unchanged}}, self.engine.generation)
+        if changed:
+            await self.mark_rollups_dirty()
+            await sync_write(
+                self.collection,
+                changed,
+                ["integration_user_id"] + DOCUMENT_KEYS[self.collection],
+                self.engine.generation
+            )
+            await self.index(changed)
+            self.record_rollup_changes([(stored.get(document.get(self.id_field)), document) for document in changed])
+
+        self.engine.record_writes("written", len(changed))
+        self.engine.record_writes("unchanged", len(documents) - len(changed))
+        return len(documents)
+
+class SyncEngine:
+    """Fetches a user's GitHub data and writes it to MongoDB.
+
+    Every sync bumps the user's sync generation. Documents carry a hash of their payload
+    and only the ones whose hash changed are upserted, stamped with the generation. A full
+    sync downloads everything and deletes the documents it did not see. An incremental
+    sync reads the per-repository watermarks stored by the previous sync and only asks
+    GitHub for newer data. Repositories and their four
+    resource types are synced concurrently, bounded by SYNC_MAX_CONCURRENCY; a resource
+    GitHub refuses is skipped and reported in the progress errors.
+    """
+
+    def __init__(self, github_api: GitHubAPI, user_id: int, mode: str = "full"):
+        self.github_api = github_api
+        self.user_id = user_id
+        self.mode = mode
+        self.stats = {
+            "organizations": 0,
+            "repositories": 0,
+            "commits": 0,
+            "pulls": 0,
+            "issues": 0,
+            "changelogs": 0,
+            "users": 0
+        }
+        self.writes = {"written": 0, "unchanged": 0, "deleted": 0}
+        self.errors: Dict[str, Dict[str, str]] = {}
+        self.repositories: List[str] = []
+        self.organizations: List[str] = []
+        self.generation = None
+        self.rollup_changes = RollupChanges()
+        self.dirty_marks: Dict[str, asyncio.Task] = {}
+        self.rollups = None
+        self.phase = "pending"
+        self.tasks_total = 0
+        self.tasks_completed = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def incremental(self) -> bool:
+        return self.mode == "incremental"
+
+    async def run(self) -> Dict[str, int]:
+        self.started_at = time.monotonic()
+        self.generation = await next_sync_generation(self.user_id)
+
+        # Bumped on both ends: reads cached while the sync was writing go stale at the end
+        await bump_data_generation(self.user_id)
+        try:
+            await self.sync_all()
+        finally:
+            await bump_data_generation(self.user_id)
+
+        self.phase = "completed"
+        return self.stats
+
+    async def sync_all(self):
+        self.phase = "organizations"
+        orgs = await self.sync_organizations()
+        self.phase = "repositories"
+        repos = await self.sync_repositories(orgs)
+        self.repositories = [repo["full_name"] for repo in repos]
+        self.organizations = [org["login"] for org in orgs]
+
+        self.phase = "repository_data"
+        self.tasks_total = len(repos) * 4
+
+        # GitHub errors of one repository are recorded in self.errors and the others carry on;
+        # any other failure cancels the rest, so a sync never half-succeeds silently
+        try:
+            async with asyncio.TaskGroup() as group:
+                for repo in repos:
+                    for sync_resource in (self.sync_commits, self.sync_pulls, self.sync_issues, self.sync_events):
+                        group.create_task(self.run_limited(sync_resource, repo))
+        except ExceptionGroup as e:
+            raise e.exceptions[0]
+
+        if not self.incremental:
+            self.phase = "cleanup"
+            await self.delete_unseen_documents()
+
+        # Only repositories whose commits, pulls or issues changed are refreshed, from those changes.
+        # Ones still dirty from an earlier sync that didn't get this far are recomputed in full.
+        self.phase = "rollups"
+        dirty = await dirty_repositories(self.user_id)
+        changes = {
+            repository: repository_changes
+            for repository, repository_changes in self.rollup_changes.repositories.items()
+            if dirty.get(repository) == self.generation
+        }
+        repositories = set(self.rollup_changes.repositories) | set(dirty)
+        self.rollups = await refresh_rollups(self.user_id, sorted(repositories), changes)
+
+    async def run_limited(self, sync_resource, repo: Dict[str, Any]):
+        async with get_sync_semaphore():
+            try:
+                await sync_resource(repo)
+            except GitHubAPIError as e:
+                # e.g. 403 on a SAML-protected repository, 451 for a blocked one, or a
+                # disabled issues API. The scope raised before sweeping, so its data is kept.
+                if e.status_code in FATAL_STATUSES:
+                    raise
+                resource = sync_resource.__name__.removeprefix("sync_")
+                self.errors.setdefault(repo["full_name"], {})[resource] = str(e)
+                print(f" Skipped {resource} of {repo['full_name']}: {e}")
+        self.tasks_completed += 1
+
+    def get_progress(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        eta = None
+        if self.phase == "completed":
+            eta = 0
+        elif self.tasks_completed and self.tasks_total:
+            eta = round(elapsed / self.tasks_completed * (self.tasks_total - self.tasks_completed), 1)
+
+        return {
+            "phase": self.phase,
+            "counters": dict(self.stats),
+            "writes": dict(self.writes),
+            "errors": {repository: dict(resources) for repository, resources in self.errors.items()},
+            "rollups": self.rollups,
+            "tasks": {"completed": self.tasks_completed, "total": self.tasks_total},
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta
+        }
+
+    def record(self, stat: str, count: int):
+        # Only ever called after the awaited write has finished, so concurrent
+        # tasks can't interleave between reading and updating the counter
+        self.stats[stat] += count
+
+    def record_writes(self, outcome: str, count: int):
+        self.writes[outcome] += count
+
+    async def mark_rollups_dirty(self, repository: str):
+        # Persisted before the first write to a repository's rollup sources. Concurrent
+        # writers of the same repository share one marking task and all wait for it.
+        task = self.dirty_marks.get(repository)
+        if task is None:
+            task = self.dirty_marks[repository] = asyncio.ensure_future(mark_dirty(self.user_id, repository, self.generation))
+        await task
+
+    async def delete_unseen_documents(self):
+        # Only reached after every resource synced, so a failed sync never removes data.
+        # Scopes that were synced already swept themselves; this removes whole repositories
+        # and organizations that are gone.
+        user_filter = {"integration_user_id": self.user_id}
+        for collection in REPOSITORY_COLLECTIONS:
+            gone = {**user_filter, "repository": {"$nin": self.repositories}}
+            await remove_from_index({**gone, "collection": collection})
+            deleted = await delete_many(collection, gone)
+            self.record_writes("deleted", deleted)
+        gone = {**user_filter, "organization": {"$nin": self.organizations}}
+        await remove_from_index({**gone, "collection": "github_users"})
+        deleted = await delete_many("github_users", gone)
+        self.record_writes("deleted", deleted)
+        await delete_rollups({**user_filter, "repository": {"$nin": self.repositories}})
+        await delete_unseen(SYNC_STATE_COLLECTION, user_filter, self.generation)
+
+    def writer(self, collection: str, repository: Optional[str] = None, organization: Optional[str] = None) -> ScopeWriter:
+        scope = {"integration_user_id": self.user_id}
+        if repository:
+            scope["repository"] = repository
+        if organization:
+            scope["organization"] = organization
+        return ScopeWriter(self, collection, scope)
+
+    async def get_watermark(self, repository: str, resource: str) -> Optional[Any]:
+        if not self.incremental:
+            return None
+        state = await find_one(SYNC_STATE_COLLECTION, {
+            "integration_user_id": self.user_id,
+            "repository": repository,
+            "resource": resource
+        })
+        return state.get("watermark") if state else None
+
+    async def save_watermark(self, repository: str, resource: str, watermark: Optional[Any]):
+        if watermark is None and self.incremental:
+            return
+        key = {"integration_user_id": self.user_id, "repository": repository, "resource": resource}
+        await replace_one(
+            SYNC_STATE_COLLECTION,
+            key,
+            {**key, "watermark": watermark, "sync_generation": self.generation, "updated_at": datetime.utcnow()},
+            upsert=True
+        )
+
+    async def sync_organizations(self) -> List[Dict[str, Any]]:
+        orgs = await self.github_api.list_user_organizations()
+
+        for org in orgs:
+            org["integration_user_id"] = self.user_id
+        async with self.writer("github_organizations") as writer:
+            written = await writer.write(orgs)
+        self.record("organizations", written)
+
+        # Fetch organization members
+        for org in orgs:
+            members = await self.github_api.list_all(self.github_api.iter_organization_members(org["login"]))
+            for member in members:
+                member["integration_user_id"] = self.user_id
+                member["organization"] = org["login"]
+            async with self.writer("github_users", organization=org["login"]) as writer:
+                written = await writer.write(members)
+            self.record("users", written)
+
+        return orgs
+
+    async def sync_repositories(self, orgs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        all_repos = await self.github_api.list_all(self.github_api.iter_user_repos())
+
+        # Fetch organization repositories
+        for org in orgs:
+            all_repos.extend(await self.github_api.list_all(self.github_api.iter_organization_repos(org["login"])))
+
+        # /user/repos already includes org repositories the user can access
+        all_repos = list({repo["id"]: repo for repo in all_repos}.values())
+
+        for repo in all_repos:
+            repo["integration_user_id"] = self.user_id
+            # Rename 'language' to 'primary_language' to avoid MongoDB conflicts
+            if "language" in repo:
+                repo["primary_language"] = repo.pop("language")
+
+        async with self.writer("github_repos") as writer:
+            written = await writer.write(all_repos)
+        self.record("repositories", written)
+        return all_repos
+
+    def tag(self, documents: List[Dict[str, Any]], repo: Dict[str, Any]) -> List[Dict[str, Any]]:
+        for document in documents:
+            document["integration_user_id"] = self.user_id
+            document["repository"] = repo["full_name"]
+        return documents
+
+    async def sync_commits(self, repo: Dict[str, Any]):
+        since = await self.get_watermark(repo["full_name"], "commits")
+        watermark = since
+
+        async with self.writer("github_commits", repository=repo["full_name"]) as writer:
+            async for commits in self.github_api.iter_repository_commits(repo["owner"]["login"], repo["name"], since=since):
+                written = await writer.write(self.tag(commits, repo))
+                self.record("commits", written)
+                watermark = latest(watermark, [commit_date(commit) for commit in commits])
+
+        await self.save_watermark(repo["full_name"], "commits", watermark)
+
+    async def sync_pulls(self, repo: Dict[str, Any]):
+        since = await self.get_watermark(repo["full_name"], "pulls")
+        watermark = since
+
+        if since:
+            # Newest updates first, one page at a time, until we reach what we already have
+            pages = self.github_api.iter_repository_pulls(
+                repo["owner"]["login"], repo["name"], sort="updated", direction="desc", concurrency=1
+            )
+        else:
+            pages = self.github_api.iter_repository_pulls(repo["owner"]["login"], repo["name"])
+
+        async with self.writer("github_pulls", repository=repo["full_name"]) as writer, aclosing(pages):
+            async for pulls in pages:
+                changed = [pull for pull in pulls if not since or pull.get("updated_at", "") >= since]
+                written = await writer.write(self.tag(changed, repo))
+                self.record("pulls", written)
+                watermark = latest(watermark, [pull.get("updated_at") for pull in changed])
+                if len(changed) < len(pulls):
+                    break
+
+        await self.save_watermark(repo["full_name"], "pulls", watermark)
+
+    async def sync_issues(self, repo: Dict[str, Any]):
+        since = await self.get_watermark(repo["full_name"], "issues")
+        watermark = since
+
+        async with self.writer("github_issues", repository=repo["full_name"]) as writer:
+            async for issues in self.github_api.iter_repository_issues(repo["owner"]["login"], repo["name"], since=since):
+                issue_documents = [issue for issue in issues if "pull_request" not in issue]
+                written = await writer.write(self.tag(issue_documents, repo))
+                self.record("issues", written)
+                watermark = latest(watermark, [issue.get("updated_at") for issue in issues])
+
+        await self.save_watermark(repo["full_name"], "issues", watermark)
+
+    async def sync_events(self, repo: Dict[str, Any]):
+        last_seen_id = await self.get_watermark(repo["full_name"], "changelogs")
+        watermark = last_seen_id
+
+        pages = self.github_api.iter_repository_issue_events(
+            repo["owner"]["login"], repo["name"], concurrency=1 if last_seen_id else None
+        )
+        async with self.writer("github_changelogs", repository=repo["full_name"]) as writer, aclosing(pages):
+            async for events in pages:
+                new_events = [event for event in events if not last_seen_id or event["id"] > last_seen_id]
+                written = await writer.write(self.tag(new_events, repo))
+                self.record("changelogs", written)
+                watermark = latest(watermark, [event["id"] for event in new_events])
+                if len(new_events) < len(events):
+                    break
+
+        await self.save_watermark(repo["full_name"], "changelogs", watermark)
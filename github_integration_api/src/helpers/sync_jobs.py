@@ -0,0 +1,261 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+from ..config import settings
+from .database import find_one, find_one_and_update, update_one
+from .github_api import GitHubAPI
+from .sync_engine import SyncEngine
+
+JOBS_COLLECTION = "github_sync_jobs"
+
+class SyncWorkers:
+    tasks: List[asyncio.Task] = []
+    wakeup: asyncio.Event = None
+
+sync_workers = SyncWorkers()
+
+def worker_name(index: int) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+def serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "job_id": job["_id"],
+        "user_id": job["user_id"],
+        "mode": job.get("mode"),
+        "status": job.get("status"),
+        "phase": (job.get("progress") or {}).get("phase", job.get("status")),
+        "progress": job.get("progress"),
+        "sync_stats": job.get("sync_stats"),
+        "cache": job.get("cache"),
+        "rate_limit": job.get("rate_limit"),
+        "error": job.get("error"),
+        "attempts": job.get("attempts", 0),
+        "worker_id": job.get("worker_id"),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at")
+    }
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        return await find_one(JOBS_COLLECTION, {"_id": ObjectId(job_id)})
+    except InvalidId:
+        return None
+
+async def enqueue_sync_job(user_id: int, mode: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """Returns the user's active job, creating it if needed, and whether an existing job was reused.
+
+    The job is None if the active job kept finishing between the upsert and the read.
+    """
+    new_id = ObjectId()
+    now = datetime.utcnow()
+    job = None
+
+    for _ in range(3):
+        try:
+            job = await find_one_and_update(
+                JOBS_COLLECTION,
+                {"user_id": user_id, "active": True},
+                {"$setOnInsert": {
+                    "_id": new_id,
+                    "mode": mode,
+                    "status": "queued",
+                    "progress": None,
+                    "attempts": 0,
+                    "created_at": now,
+                    "updated_at": now
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another request for the same user inserted first; read its job
+            job = await find_one(JOBS_COLLECTION, {"user_id": user_id, "active": True})
+        if job:
+            break
+    else:
+        return None, False
+
+    attached = job["_id"] != str(new_id)
+    if not attached and sync_workers.wakeup is not None:
+        sync_workers.wakeup.set()
+    return job, attached
+
+async def claim_next_job(worker_id: str) -> Optional[Dict[str, Any]]:
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=settings.sync_job_stale_seconds)
+
+    # Running jobs whose worker stopped heartbeating are picked up again
+    return await find_one_and_update(
+        JOBS_COLLECTION,
+        {
+            "active": True,
+            "$or": [
+                {"status": "queued"},
+                {"status": "running", "heartbeat_at": {"$lt": stale_before}}
+            ]
+        },
+        {
+            "$set": {
+                "status": "running",
+                "worker_id": worker_id,
+                "started_at": now,
+                "heartbeat_at": now,
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", 1)]
+    )
+
+async def report_progress(job_id: ObjectId, worker_id: str, engine: SyncEngine, sync: asyncio.Task):
+    """Heartbeats the job and stops the sync as soon as this worker no longer owns it.
+
+    That happens when the job was cancelled (the integration was removed) or reclaimed by
+    another worker, or when heartbeats kept failing for long enough that it may be reclaimed.
+    """
+    last_beat = time.monotonic()
+    while True:
+        await asyncio.sleep(settings.sync_job_progress_interval)
+        now = datetime.utcnow()
+        try:
+            owned = await update_one(JOBS_COLLECTION, {"_id": job_id, "worker_id": worker_id, "status": "running"}, {
+                "progress": engine.get_progress(),
+                "heartbeat_at": now,
+                "updated_at": now
+            })
+            last_beat = time.monotonic()
+        except Exception as e:
+            print(f"Sync job {job_id} heartbeat failed: {e}")
+            owned = time.monotonic() - last_beat < settings.sync_job_stale_seconds / 2
+
+        if not owned:
+            print(f"Sync job {job_id} is no longer owned by {worker_id}, stopping it")
+            sync.cancel()
+            return
+
+async def finish_job(job_id: ObjectId, worker_id: str, status: str, fields: Dict[str, Any]):
+    now = datetime.utcnow()
+    # A job that was cancelled or reclaimed in the meantime is left to its new owner
+    await update_one(JOBS_COLLECTION, {"_id": job_id, "worker_id": worker_id, "status": "running"}, {
+        **fields,
+        "status": status,
+        "active": False,
+        "finished_at": now,
+        "updated_at": now
+    })
+
+async def run_job(job: Dict[str, Any], worker_id: str):
+    job_id = ObjectId(job["_id"])
+    user_id = job["user_id"]
+    mode = job.get("mode", "full")
+
+    integration = await find_one("github_integration", {"user_id": user_id})
+    if not integration or not integration.get("access_token"):
+        await finish_job(job_id, worker_id, "failed", {"error": "Integration or access token not found"})
+        return
+
+    github_api = GitHubAPI(integration["access_token"], user_id)
+    engine = SyncEngine(github_api, user_id, mode)
+    sync = asyncio.create_task(engine.run())
+    heartbeat = asyncio.create_task(report_progress(job_id, worker_id, engine, sync))
+
+    try:
+        sync_stats = await sync
+
+        await update_one(
+            "github_integration",
+            {"user_id": user_id},
+            {"last_sync": datetime.utcnow(), "last_sync_mode": mode}
+        )
+        await finish_job(job_id, worker_id, "completed", {
+            "progress": engine.get_progress(),
+            "sync_stats": sync_stats,
+            "cache": github_api.get_cache_stats(),
+            "rate_limit": github_api.get_rate_limit_state()
+        })
+    except asyncio.CancelledError:
+        if not asyncio.current_task().cancelling():
+            # Stopped by the heartbeat: tell a waiting cancel_user_job that nothing is writing anymore
+            await update_one(JOBS_COLLECTION, {"_id": job_id, "worker_id": worker_id}, {"stopped_at": datetime.utcnow()})
+            return
+        # Worker is shutting down: hand the job back so another worker resumes it
+        sync.cancel()
+        await update_one(JOBS_COLLECTION, {"_id": job_id, "worker_id": worker_id, "status": "running"}, {
+            "status": "queued",
+            "worker_id": None,
+            "updated_at": datetime.utcnow()
+        })
+        raise
+    except Exception as e:
+        print(f"Sync job {job_id} failed: {e}")
+        await finish_job(job_id, worker_id, "failed", {
+            "progress": engine.get_progress(),
+            "sync_stats": engine.stats,
+            "error": str(e)
+        })
+    finally:
+        heartbeat.cancel()
+
+async def cancel_user_job(user_id: int):
+    """Cancels the user's active job and waits briefly for a running sync to stop writing."""
+    now = datetime.utcnow()
+    job = await find_one_and_update(
+        JOBS_COLLECTION,
+        {"user_id": user_id, "active": True},
+        {"$set": {"status": "cancelled", "active": False, "finished_at": now, "updated_at": now}}
+    )
+    if not job or not job.get("worker_id"):
+        return
+
+    # The worker notices at its next heartbeat; after that it is treated as gone
+    deadline = time.monotonic() + settings.sync_job_progress_interval * 3
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.sync_job_progress_interval / 4)
+        job = await find_one(JOBS_COLLECTION, {"_id": ObjectId(job["_id"])})
+        if not job or job.get("stopped_at"):
+            return
+    print(f"Sync job {job['_id']} did not confirm it stopped")
+
+async def run_worker(worker_id: str):
+    while True:
+        try:
+            job = await claim_next_job(worker_id)
+        except Exception as e:
+            print(f"Sync worker {worker_id} could not claim a job: {e}")
+            job = None
+
+        if job:
+            print(f" Sync worker {worker_id} running job {job['_id']} for user {job['user_id']}")
+            try:
+                await run_job(job, worker_id)
+            except Exception as e:
+                # e.g. MongoDB unreachable while recording the outcome; the job goes stale and is reclaimed
+                print(f"Sync worker {worker_id} could not finish job {job['_id']}: {e}")
+            continue
+
+        try:
+            await asyncio.wait_for(sync_workers.wakeup.wait(), timeout=settings.sync_job_poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        sync_workers.wakeup.clear()
+
+async def start_sync_workers(count: int = None):
+    count = settings.sync_workers if count is None else count
+
+    sync_workers.wakeup = asyncio.Event()
+    sync_workers.tasks = [
+        asyncio.create_task(run_worker(worker_name(index)))
+        for index in range(count)
+    ]
+
+async def stop_sync_workers():
+    for task in sync_workers.tasks:
+        task.cancel()
+    await asyncio.gather(*sync_workers.tasks, return_exceptions=True)
+    sync_workers.tasks = []
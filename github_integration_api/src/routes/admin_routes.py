@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Query
+from ..controllers.admin_controller import AdminController
+from typing import Optional
+
+router = APIRouter(prefix="/admin", tags=["Administration"])
+
+@router.get("/indexes")
+async def get_indexes():
+    
+    return await AdminController.get_indexes()
+
+@router.post("/indexes/sync")
+async def sync_indexes(
+    drop_conflicting: bool = Query(False, description="Drop and rebuild indexes whose definition changed")
+):
+    
+    return await AdminController.sync_indexes(drop_conflicting)
+
+@router.get("/database")
+async def get_database_stats():
+    
+    return await AdminController.get_database_stats()
+
+@router.get("/search-index")
+async def get_search_index():
+    
+    return await AdminController.get_search_index()
+
+@router.post("/search-index/rebuild")
+async def rebuild_search_index():
+    
+    return await AdminController.rebuild_search_index()
+
+@router.get("/cache")
+async def get_cache_stats():
+    
+    return await AdminController.get_cache_stats()
+
+@router.post("/cache/clear")
+async def clear_cache():
+    
+    return await AdminController.clear_cache()
+
+@router.post("/analytics/rebuild")
+async def rebuild_rollups(
+    user_id: Optional[int] = Query(None, description="Only rebuild this user's rollups")
+):
+    
+    return await AdminController.rebuild_rollups(user_id)
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Query
+from ..controllers.analytics_controller import AnalyticsController
+from datetime import date
+from typing import Optional
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+@router.get("/repositories")
+async def get_repositories(user_id: int):
+    
+    return await AnalyticsController.get_repositories(user_id)
+
+@router.get("/repositories/{owner}/{repo}")
+async def get_repository(
+    owner: str,
+    repo: str,
+    user_id: int,
+    since: Optional[date] = Query(None, description="First week to include (YYYY-MM-DD)"),
+    until: Optional[date] = Query(None, description="Last week to include (YYYY-MM-DD)")
+):
+    
+    return await AnalyticsController.get_repository(user_id, f"{owner}/{repo}", since, until)
+
+@router.get("/authors")
+async def get_author_weeks(
+    user_id: int,
+    repository: Optional[str] = Query(None, description="owner/name"),
+    author: Optional[str] = Query(None, description="GitHub login, or commit email when the commit has no linked account"),
+    since: Optional[date] = Query(None, description="First week to include (YYYY-MM-DD)"),
+    until: Optional[date] = Query(None, description="Last week to include (YYYY-MM-DD)"),
+    limit: int = Query(1000, ge=1, le=10000, description="Maximum rows")
+):
+    
+    return await AnalyticsController.get_author_weeks(user_id, repository, author, since, until, limit)
@@ -7,24 +7,45 @@ router = APIRouter(tags=["Data Management"])
 @router.get("/data/{collection}")
 async def get_collection_data(
     collection: str,
+    user_id: int = Query(..., description="Integration whose data is returned"),
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(20, ge=1, le=100, description="Items per page"),
     sort_by: Optional[str] = Query(None, description="Field name to sort by"),
     sort_order: str = Query("asc", regex="^(asc|desc)$", description="Sort order: asc or desc"),
     filter: Optional[str] = Query(None, description="JSON object of filters"),
-    search: Optional[str] = Query(None, description="Keyword search across all fields")
+    search: Optional[str] = Query(None, description="Keyword search across all fields"),
+    search_mode: str = Query("substring", regex="^(substring|fuzzy)$", description="substring: every character must match; fuzzy: tolerates typos"),
+    cursor: Optional[str] = Query(None, description="next_cursor/prev_cursor from a previous response; replaces page"),
+    include_total: bool = Query(True, description="Include total_items/total_pages (an extra count query)"),
+    view: str = Query("full", regex="^(summary|full)$", description="Response shape: summary or full"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. number,title,user.login")
 ):
 
     return await DataController.get_collection_data(
         collection=collection,
+        user_id=user_id,
         page=page,
         limit=limit,
         sort_by=sort_by,
         sort_order=sort_order,
         filter_json=filter,
-        search=search
+        search=search,
+        search_mode=search_mode,
+        cursor=cursor,
+        include_total=include_total,
+        view=view,
+        fields=fields
     )
 
 @router.get("/search")
-async def global_search(q: str = Query(..., min_length=2, description="Search keyword")):
-    return await DataController.global_search(q)
+async def global_search(
+    q: str = Query(..., min_length=2, description="Search keyword"),
+    user_id: int = Query(..., description="Integration whose data is searched"),
+    mode: str = Query(
+        "text",
+        regex="^(text|substring|fuzzy|regex)$",
+        description="text: ranked full-text search; substring/fuzzy: trigram index on names, titles and messages; regex: unindexed scan (slow)"
+    )
+):
+
+    return await DataController.global_search(q, user_id, mode)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Query
+from ..controllers.export_controller import ExportController
+from typing import Optional
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+@router.get("/{collection}")
+async def export_collection(
+    collection: str,
+    user_id: int = Query(..., description="Integration whose data is exported"),
+    format: str = Query(
+        "ndjson",
+        regex="^(ndjson|csv|parquet|arrow)$",
+        description="ndjson: one JSON document per line; csv: one row per document; parquet/arrow: flattened columns"
+    ),
+    filter: Optional[str] = Query(None, description="JSON object of filters"),
+    view: str = Query("full", regex="^(summary|full)$", description="Document shape: summary or full"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to export (CSV columns), e.g. sha,commit.author.date"),
+    limit: int = Query(0, ge=0, description="Maximum documents, 0 for all")
+):
+
+    return await ExportController.export_collection(
+        collection=collection,
+        user_id=user_id,
+        format=format,
+        filter_json=filter,
+        view=view,
+        fields=fields,
+        limit=limit
+    )
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from ..controllers.integration_controller import IntegrationController
 
 router = APIRouter(prefix="/integration", tags=["Integration Management"])
@@ -8,6 +8,11 @@ async def get_integration_status(user_id: int):
     
     return await IntegrationController.get_integration_status(user_id)
 
+@router.get("/rate-limit")
+async def get_rate_limit_status(user_id: int):
+    
+    return await IntegrationController.get_rate_limit_status(user_id)
+
 @router.post("/remove")
 async def remove_integration(user_id: int):
     
@@ -17,3 +22,16 @@ async def remove_integration(user_id: int):
 async def resync_integration_data(user_id: int):
     
     return await IntegrationController.resync_data(user_id)
+
+@router.post("/sync")
+async def sync_integration_data(
+    user_id: int,
+    mode: str = Query("incremental", regex="^(full|incremental)$", description="full or incremental")
+):
+    
+    return await IntegrationController.resync_data(user_id, mode)
+
+@router.get("/jobs/{job_id}")
+async def get_sync_job(job_id: str):
+    
+    return await IntegrationController.get_sync_job(job_id)
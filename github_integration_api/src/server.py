@@ -1,11 +1,20 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from .routes import auth_routes, integration_routes, data_routes
-from .helpers.database import connect_to_mongo, close_mongo_connection
+from .routes import auth_routes, integration_routes, data_routes, admin_routes, analytics_routes, export_routes
+from .helpers.database import connect_to_mongo, close_mongo_connection, ensure_indexes
+from .helpers.github_api import open_github_client, close_github_client
+from .helpers.search_index import load_search_index
+from .helpers.sync_jobs import start_sync_workers, stop_sync_workers
 from .config import settings
 
+def report_task_failure(task: asyncio.Task):
+    # Background startup tasks aren't awaited, so their failures would go unnoticed
+    if not task.cancelled() and task.exception() is not None:
+        print(f" Background startup task failed: {task.exception()}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
@@ -17,12 +26,34 @@ async def lifespan(app: FastAPI):
         await connect_to_mongo()
         print(" Connected to MongoDB")
         
+        # Index builds can take a while on large collections, so they don't hold up startup
+        index_task = asyncio.create_task(ensure_indexes())
+        # Search falls back to MongoDB queries until the trigram index is in memory
+        search_index_task = asyncio.create_task(load_search_index())
+        index_task.add_done_callback(report_task_failure)
+        search_index_task.add_done_callback(report_task_failure)
+        
+        await open_github_client()
+        print(" GitHub HTTP client ready")
+        
+        await start_sync_workers()
+        print(f" Started {settings.sync_workers} sync worker(s)")
+        
     except Exception as e:
         print(f" Startup failed: {e}")
         raise
         
     yield
     
+    index_task.cancel()
+    search_index_task.cancel()
+    
+    await stop_sync_workers()
+    print(" Sync workers stopped")
+    
+    await close_github_client()
+    print(" GitHub HTTP client closed")
+    
     await close_mongo_connection()
     print(" Disconnected from MongoDB")
 
@@ -44,6 +75,9 @@ app.add_middleware(
 app.include_router(auth_routes.router)
 app.include_router(integration_routes.router)
 app.include_router(data_routes.router)
+app.include_router(admin_routes.router)
+app.include_router(analytics_routes.router)
+app.include_router(export_routes.router)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,32 @@
+import asyncio
+import sys
+from src.config import settings
+from src.helpers.database import connect_to_mongo, close_mongo_connection
+from src.helpers.github_api import open_github_client, close_github_client
+from src.helpers.sync_jobs import start_sync_workers, stop_sync_workers, sync_workers
+
+# Runs sync jobs outside the API process. Start the API with SYNC_WORKERS=0
+# to leave all jobs to separate worker processes.
+async def main(count: int):
+
+    await connect_to_mongo()
+    print(" Connected to MongoDB")
+
+    await open_github_client()
+    await start_sync_workers(count)
+    print(f" Started {count} sync worker(s), waiting for jobs")
+
+    try:
+        await asyncio.gather(*sync_workers.tasks)
+    finally:
+        await stop_sync_workers()
+        await close_github_client()
+        await close_mongo_connection()
+        print(" Sync workers stopped")
+
+if __name__ == "__main__":
+    worker_count = int(sys.argv[1]) if len(sys.argv) > 1 else max(settings.sync_workers, 1)
+    try:
+        asyncio.run(main(worker_count))
+    except KeyboardInterrupt:
+        pass